@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from services import np, pd
+
+
+def holdings_matrix(
+    baseline: dict, trades: list, index: pd.DatetimeIndex, tickers: list[str]
+) -> pd.DataFrame:
+    """Shares held per ticker on every date of ``index``.
+
+    ``baseline`` is the position going into the window and ``trades`` are
+    (trade_date, ticker, signed shares) deltas. A trade counts from the first
+    date in ``index`` on or after its trade date; trades before the window fold
+    into the starting position and trades after it are ignored.
+    """
+    col_of = {ticker: i for i, ticker in enumerate(tickers)}
+    held = np.zeros((len(index), len(tickers)))
+    held[0, :] = [baseline.get(ticker, 0) for ticker in tickers]
+
+    if trades:
+        dates = pd.to_datetime([t[0] for t in trades])
+        rows = index.searchsorted(dates)
+        cols = np.array([col_of.get(t[1], -1) for t in trades])
+        amounts = np.array([t[2] for t in trades], dtype=float)
+        keep = (rows < len(index)) & (cols >= 0)
+        np.add.at(held, (rows[keep], cols[keep]), amounts[keep])
+
+    return pd.DataFrame(np.cumsum(held, axis=0), index=index, columns=tickers)
+
+
+HOLDINGS_COLUMNS = ["Ticker", "Shares", "Price", "Value", "Daily PnL", "Portfolio %"]
+
+
+def holdings_table(portfolio: dict, quotes: dict) -> pd.DataFrame:
+    """Dashboard holdings table, built column-wise from the shares and quote maps.
+
+    Missing prices leave NaN in Price/Value/Daily PnL rather than dropping the row.
+    """
+    shares = pd.Series(portfolio, dtype=float)
+    quote_frame = pd.DataFrame.from_dict(quotes, orient="index")
+    quote_frame = quote_frame.reindex(index=shares.index, columns=["price", "prev_close"])
+    price = pd.to_numeric(quote_frame["price"], errors="coerce")
+    prev_close = pd.to_numeric(quote_frame["prev_close"], errors="coerce")
+
+    value = shares * price
+    total = value.sum(skipna=True)
+    return pd.DataFrame(
+        {
+            "Ticker": shares.index,
+            "Shares": shares.to_numpy(),
+            "Price": price.to_numpy(),
+            "Value": value.to_numpy(),
+            "Daily PnL": (shares * (price - prev_close)).to_numpy(),
+            "Portfolio %": (value / total * 100 if total else value * np.nan).to_numpy(),
+        },
+        columns=HOLDINGS_COLUMNS,
+    )
+
+
+TRADING_DAYS = 252
+# roughly one quarter of trading days
+ROLLING_WINDOW = 63
+# a benchmark whose history starts this long after the portfolio's is left out
+# rather than cutting the whole window short
+MAX_BENCHMARK_LAG = timedelta(days=10)
+
+# three main chosen benchmarks, can easily be changed but these represent the overall market well
+BENCHMARKS = {
+    "Vanguard 500 Index (VFINX)": "VFINX",
+    "SPDR S&P 500 ETF (SPY)": "SPY",
+    "Vanguard Total Market ETF (VTI)": "VTI",
+}
+
+RELATIVE_METRICS = ("Tracking Error vs Benchmark", "Beta", "Alpha (annualized)")
+RATIO_METRICS = ("Sharpe Ratio", "Sortino Ratio", "Beta")
+
+
+@dataclass
+class BacktestResult:
+    # Portfolio plus one column per benchmark, levels on shared days starting at 1
+    growth: pd.DataFrame
+    # absolute metrics (rows) for Portfolio and every benchmark (columns)
+    metrics: pd.DataFrame
+    # portfolio-vs-benchmark metrics (rows), one column per benchmark
+    relative: pd.DataFrame
+    drawdown: pd.DataFrame
+    rolling_sharpe: pd.DataFrame
+    # summed daily weight x return per holding over the window
+    contribution: pd.Series
+
+    @property
+    def benchmarks(self) -> list[str]:
+        return list(self.relative.columns)
+
+    def versus(self, benchmark: str) -> pd.DataFrame:
+        """Portfolio / Benchmark metrics table against one of the benchmarks."""
+        table = self.metrics[["Portfolio", benchmark]].set_axis(
+            ["Portfolio", "Benchmark"], axis=1
+        )
+        relative = pd.DataFrame(
+            {"Portfolio": self.relative[benchmark], "Benchmark": np.nan}
+        )
+        return pd.concat([table, relative])
+
+
+def _holdings_array(shares, prices: pd.DataFrame) -> np.ndarray:
+    if isinstance(shares, pd.DataFrame):
+        aligned = shares.reindex(index=prices.index, columns=prices.columns)
+        return aligned.fillna(0.0).to_numpy(dtype=float)
+    vector = pd.Series(shares, dtype=float).reindex(prices.columns).fillna(0.0)
+    return np.broadcast_to(vector.to_numpy(), prices.shape)
+
+
+def _column_stats(returns: np.ndarray, levels: np.ndarray) -> dict:
+    """Absolute metrics for every column of a (days x series) returns matrix at once."""
+    n = len(returns)
+    total = levels[-1] / levels[0] - 1
+    vol = returns.std(axis=0) * np.sqrt(TRADING_DAYS)
+    downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2, axis=0)) * np.sqrt(TRADING_DAYS)
+    mean_annual = returns.mean(axis=0) * TRADING_DAYS
+    drawdown = levels / np.maximum.accumulate(levels, axis=0) - 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(np.isclose(vol, 0.0), np.nan, mean_annual / vol)
+        sortino = np.where(np.isclose(downside, 0.0), np.nan, mean_annual / downside)
+    return {
+        "Total Return": total,
+        "Annualized Return": (1 + total) ** (TRADING_DAYS / n) - 1,
+        "Annualized Volatility": vol,
+        "Sharpe Ratio": sharpe,
+        "Sortino Ratio": sortino,
+        "Max Drawdown": drawdown.min(axis=0),
+    }
+
+
+def run_backtest(
+    prices: pd.DataFrame,
+    shares,
+    benchmarks,
+    rolling_window: int = ROLLING_WINDOW,
+) -> BacktestResult | None:
+    """Backtest ``shares`` (a per-ticker vector, or a dated holdings matrix from
+    holdings_matrix) over ``prices`` against every column of ``benchmarks``.
+
+    The heavy lifting is one vectorized pass over the (days x holdings) matrix,
+    and relative metrics are computed against all benchmarks together.
+    Returns None when the portfolio and benchmarks share fewer than two days.
+    """
+    px = prices.to_numpy(dtype=float)
+    held = _holdings_array(shares, prices)
+    if len(px) < 2:
+        return None
+
+    # dollar P&L per holding per day; a holding with no prior price adds nothing
+    pnl = held[:-1] * np.diff(px, axis=0)
+    np.nan_to_num(pnl, copy=False)
+    value = held * px
+    np.nan_to_num(value, copy=False)
+    total_value = value.sum(axis=1)
+    prev_value = total_value[:-1]
+    inv_prev = np.divide(1.0, prev_value, out=np.zeros_like(prev_value), where=prev_value > 0)
+    # time-weighted, so buys and sells in the journal don't count as returns
+    portfolio_returns = pnl.sum(axis=1) * inv_prev
+
+    invested = total_value > 0
+    if not invested.any():
+        return None
+    first = int(invested.argmax())
+    # start the portfolio on the first day anything was held
+    growth = np.cumprod(np.concatenate([[1.0], 1 + portfolio_returns[first:]]))
+    portfolio_levels = pd.Series(growth, index=prices.index[first:], name="Portfolio")
+
+    if isinstance(benchmarks, pd.Series):
+        benchmarks = benchmarks.to_frame("Benchmark")
+    benchmarks = benchmarks.loc[:, benchmarks.columns != "Portfolio"]
+    starts = benchmarks.apply(pd.Series.first_valid_index)
+    late = starts.isna() | (starts > portfolio_levels.index[0] + MAX_BENCHMARK_LAG)
+    benchmarks = benchmarks.loc[:, ~late.to_numpy()]
+    if benchmarks.empty:
+        return None
+
+    combined = pd.concat([portfolio_levels, benchmarks], axis=1, join="inner").dropna()
+    if len(combined) < 2:
+        return None
+    combined = combined / combined.iloc[0]
+
+    levels = combined.to_numpy()
+    returns = levels[1:] / levels[:-1] - 1
+    r, b = returns[:, :1], returns[:, 1:]
+
+    metrics = pd.DataFrame(_column_stats(returns, levels), index=combined.columns).T
+
+    r_dev = r - r.mean(axis=0)
+    b_dev = b - b.mean(axis=0)
+    bench_var = (b_dev**2).mean(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = np.where(bench_var > 0, (r_dev * b_dev).mean(axis=0) / bench_var, np.nan)
+    relative = pd.DataFrame(
+        {
+            "Tracking Error vs Benchmark": (r - b).std(axis=0) * np.sqrt(TRADING_DAYS),
+            "Beta": beta,
+            "Alpha (annualized)": (r.mean() - beta * b.mean(axis=0)) * TRADING_DAYS,
+        },
+        index=combined.columns[1:],
+    ).T
+
+    drawdown = combined / combined.cummax() - 1
+
+    daily = combined.pct_change().iloc[1:]
+    rolling = daily.rolling(rolling_window)
+    rolling_sharpe = (rolling.mean() / rolling.std(ddof=0) * np.sqrt(TRADING_DAYS)).dropna()
+
+    # contribution over the same days the metrics cover
+    dates = prices.index[1:]
+    in_window = (dates > combined.index[0]) & (dates <= combined.index[-1])
+    contribution = pd.Series(
+        inv_prev[in_window] @ pnl[in_window], index=prices.columns, name="Contribution"
+    )
+
+    return BacktestResult(
+        growth=combined,
+        metrics=metrics,
+        relative=relative,
+        drawdown=drawdown,
+        rolling_sharpe=rolling_sharpe,
+        contribution=contribution,
+    )
+
+
+def journal_backtest(
+    history: pd.DataFrame,
+    baseline: dict,
+    trades: list,
+    portfolio_tickers,
+    benchmark_tickers,
+) -> tuple[BacktestResult | None, list[str]]:
+    """Backtest one user's journal (load_journal output) over a shared close-price
+    frame holding both their tickers and the benchmarks.
+
+    Returns the result (None if nothing lined up) and the portfolio tickers
+    that had prices.
+    """
+    available = [t for t in portfolio_tickers if t in history.columns]
+    benchmarks = [t for t in dict.fromkeys(benchmark_tickers) if t in history.columns]
+    if not available or not benchmarks:
+        return None, available
+
+    prices = history[available].dropna(how="all")
+    held = holdings_matrix(baseline, trades, prices.index, available)
+    return run_backtest(prices, held, history[benchmarks]), available
+
+
+def too_new_to_backtest(baseline: dict, trades: list, last_day: date) -> bool:
+    """True when nothing was held before ``last_day``, the latest trading day in
+    the window, so there isn't a single daily return to measure yet.
+
+    New positions default to today's date, so a fresh portfolio lands here.
+    """
+    if any(baseline.values()):
+        return False
+    dates = [pd.Timestamp(day).date() for day, _, shares in trades if shares]
+    return bool(dates) and min(dates) >= last_day
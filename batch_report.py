@@ -0,0 +1,189 @@
+"""Nightly portfolio metrics for every user, without the streamlit UI.
+
+Reads every user's trade journal from the store, loads price history once
+for the union of their tickers and the benchmarks, then backtests users in
+parallel on a process pool and writes one row per user.
+
+    python -m batch_report                              # last year, data/reports/metrics-<end>.parquet
+    python -m batch_report --start 2025-01-01 --out report.csv
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from pathlib import Path
+
+from analytics import BENCHMARKS, journal_backtest, too_new_to_backtest
+from history_store import load_history_frame
+from services import pd
+from storage import load_journals
+
+REPORTS_DIR = Path(__file__).resolve().parent / "data" / "reports"
+# worker processes, defaults to one per core
+BATCH_WORKERS = int(os.environ.get("CPORTFOLIO_BATCH_WORKERS", 0)) or os.cpu_count() or 1
+# users per task sent to a worker, so per-task overhead stays small next to the backtests
+BATCH_SIZE = 200
+# below this many users a pool costs more than it saves
+MIN_POOL_USERS = 2 * BATCH_SIZE
+
+RELATIVE_COLUMNS = {
+    "Tracking Error vs Benchmark": "tracking_error",
+    "Beta": "beta",
+    "Alpha (annualized)": "alpha",
+}
+
+# set once per worker process by _init_worker
+_history = None
+_benchmarks = ()
+
+
+def _column(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+
+def _init_worker(history: pd.DataFrame, benchmarks: tuple[str, ...]) -> None:
+    # the shared frame goes to each worker once, not once per user
+    global _history, _benchmarks
+    _history = history
+    _benchmarks = benchmarks
+
+
+def user_row(username: str, baseline: dict, trades: list) -> dict:
+    """One report row: the portfolio's metrics plus its metrics against each benchmark."""
+    tickers = list(dict.fromkeys([*baseline, *(ticker for _, ticker, _ in trades)]))
+    # the shared frame spans everyone's calendars (crypto weekends, TSX holidays);
+    # cut it down to this user's symbols and fill that, exactly as the page's
+    # load_history_frame call would
+    columns = [t for t in dict.fromkeys([*tickers, *_benchmarks]) if t in _history.columns]
+    history = _history[columns].dropna(how="all").ffill()
+    result, available = journal_backtest(history, baseline, trades, tickers, _benchmarks)
+    row = {"username": username, "tickers": len(tickers), "priced": len(available)}
+    if result is None:
+        if not tickers:
+            row["status"] = "no holdings"
+        elif not available:
+            row["status"] = "no price history"
+        elif not history.empty and too_new_to_backtest(baseline, trades, history.index[-1].date()):
+            row["status"] = "too new to backtest"
+        else:
+            row["status"] = "no overlap with benchmarks"
+        return row
+
+    row["status"] = "ok"
+    row["start"] = result.growth.index[0].date()
+    row["end"] = result.growth.index[-1].date()
+    row["days"] = len(result.growth)
+    for metric, value in result.metrics["Portfolio"].items():
+        row[_column(metric)] = value
+    for benchmark in result.benchmarks:
+        suffix = _column(benchmark)
+        for metric, column in RELATIVE_COLUMNS.items():
+            row[f"{column}_{suffix}"] = result.relative.at[metric, benchmark]
+        row[f"excess_return_{suffix}"] = (
+            result.metrics.at["Total Return", "Portfolio"]
+            - result.metrics.at["Total Return", benchmark]
+        )
+    return row
+
+
+def _user_rows(batch: list[tuple]) -> list[dict]:
+    return [user_row(*job) for job in batch]
+
+
+def build_report(
+    start: date,
+    end: date,
+    benchmarks=tuple(BENCHMARKS.values()),
+    workers: int = BATCH_WORKERS,
+    progress=print,
+) -> pd.DataFrame:
+    """Metrics for every user in the store over [start, end], one row each."""
+    t0 = time.perf_counter()
+    journals = load_journals(start)
+    progress(f"{len(journals):,} users read in {time.perf_counter() - t0:.1f}s")
+
+    # one deduplicated load for everyone's tickers; the history store only
+    # downloads what it doesn't already have on disk
+    tickers = dict.fromkeys(benchmarks)
+    for baseline, trades in journals.values():
+        tickers.update(dict.fromkeys(baseline))
+        tickers.update(dict.fromkeys(ticker for _, ticker, _ in trades))
+    t0 = time.perf_counter()
+    # nobody is waiting on a page here, so no deadline; left unfilled so each
+    # user's rows can be filled over their own symbols only
+    history, failed = load_history_frame(list(tickers), start, end, deadline=None, fill=False)
+    progress(
+        f"{len(tickers):,} symbols loaded in {time.perf_counter() - t0:.1f}s"
+        + (f", {len(failed):,} without history" if failed else "")
+    )
+
+    jobs = [(username, baseline, trades) for username, (baseline, trades) in journals.items()]
+    batches = [jobs[i : i + BATCH_SIZE] for i in range(0, len(jobs), BATCH_SIZE)]
+    t0 = time.perf_counter()
+    rows = []
+    if workers <= 1 or len(jobs) < MIN_POOL_USERS:
+        _init_worker(history, tuple(benchmarks))
+        for batch in batches:
+            rows.extend(_user_rows(batch))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(batches)),
+            initializer=_init_worker,
+            initargs=(history, tuple(benchmarks)),
+        ) as pool:
+            futures = [pool.submit(_user_rows, batch) for batch in batches]
+            for done, future in enumerate(as_completed(futures), 1):
+                rows.extend(future.result())
+                if done % 10 == 0 or done == len(futures):
+                    progress(f"{len(rows):,}/{len(jobs):,} users backtested")
+    progress(f"{len(rows):,} users backtested in {time.perf_counter() - t0:.1f}s")
+
+    report = pd.DataFrame(rows)
+    if report.empty:
+        return report
+    return report.sort_values("username", ignore_index=True)
+
+
+def write_report(report: pd.DataFrame, out: Path) -> None:
+    out.parent.mkdir(parents=True, exist_ok=True)
+    if out.suffix == ".csv":
+        report.to_csv(out, index=False)
+    else:
+        report.to_parquet(out, index=False)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    today = date.today()
+    parser.add_argument("--start", type=date.fromisoformat, default=today - timedelta(days=365))
+    parser.add_argument("--end", type=date.fromisoformat, default=today)
+    parser.add_argument(
+        "--benchmarks",
+        default=",".join(BENCHMARKS.values()),
+        help="comma-separated benchmark tickers",
+    )
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--out", type=Path, help=".parquet or .csv (default data/reports/)")
+    args = parser.parse_args(argv)
+
+    if args.start >= args.end:
+        parser.error("--start must be earlier than --end")
+    out = args.out or REPORTS_DIR / f"metrics-{args.end.isoformat()}.parquet"
+    if out.suffix not in (".parquet", ".csv"):
+        parser.error("--out must end in .parquet or .csv")
+    benchmarks = tuple(dict.fromkeys(t.strip().upper() for t in args.benchmarks.split(",") if t.strip()))
+
+    report = build_report(args.start, args.end, benchmarks, args.workers)
+    write_report(report, out)
+    ok = int((report["status"] == "ok").sum()) if not report.empty else 0
+    print(f"{ok:,} of {len(report):,} users reported, written to {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
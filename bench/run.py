@@ -0,0 +1,344 @@
+"""Headless page benchmarks against offline stubs.
+
+Drives home, dashboard, metrics and insight through streamlit's AppTest over
+a sweep of synthetic user stores and portfolio sizes, recording cold run and
+rerun latency, peak traced memory and upstream call counts per page.
+
+    python -m bench.run --record bench/baseline.json
+    python -m bench.run --check bench/baseline.json
+
+Everything runs against a throwaway data directory, never data/.
+"""
+import argparse
+import csv
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import streamlit as st  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import history_store  # noqa: E402
+import insights  # noqa: E402
+import market_data  # noqa: E402
+import news  # noqa: E402
+import news_store  # noqa: E402
+import resilience  # noqa: E402
+import storage  # noqa: E402
+import symbols  # noqa: E402
+from bench import stubs  # noqa: E402
+from quote_cache import QUOTES  # noqa: E402
+from quote_refresher import REFRESHER  # noqa: E402
+from security import hash_password  # noqa: E402
+
+HOLDINGS = [10, 100, 1000, 10000]
+USERS = [1, 100, 10000, 100000]
+PAGES = ["home", "dashboard", "metrics", "insight"]
+RERUNS = 5
+# every other user holds this many tickers from the shared universe
+OTHER_USER_HOLDINGS = 5
+BENCH_USER = "bench"
+BENCH_PASSWORD = "bench-password"
+BENCH_KEY = "bench"
+BENCH_NEWS_RATE = 1_000_000
+PAGE_TIMEOUT = 120
+INSIGHT_TIMEOUT = 30
+# --check fails a page whose rerun is this much slower than the baseline...
+LATENCY_TOLERANCE = 0.5
+# ...but ignores differences under this many milliseconds
+LATENCY_FLOOR_MS = 25
+MEMORY_TOLERANCE = 0.25
+
+
+def universe(n: int) -> list[str]:
+    return [f"S{i:05d}" for i in range(n)]
+
+
+def isolate(data_dir: Path) -> None:
+    """Point the user store at ``data_dir``."""
+    storage.DB_PATH = data_dir / "users.db"
+    storage.LEGACY_PATHS = ()
+    storage._local = threading.local()
+    storage._CACHE.invalidate()
+    # background passes would make the call counts depend on the wall clock
+    REFRESHER.stop()
+    REFRESHER.interval = 0
+
+
+def drop_caches(data_dir: Path) -> None:
+    """Fresh history and news stores under ``data_dir`` and empty in-process caches,
+    so every page's first run is cold."""
+    history_store.HISTORY.root = data_dir / "history"
+    history_store.HISTORY.root.mkdir(parents=True, exist_ok=True)
+
+    news_store.NEWS.path = data_dir / "news.db"
+    news_store.NEWS._local = threading.local()
+    # the real per-key limit would turn large portfolios into minutes of sleeping
+    for client in news._clients.values():
+        client.pool.shutdown(wait=False)
+    news._clients.clear()
+    news._clients[BENCH_KEY] = news.NewsClient(BENCH_KEY, calls_per_minute=BENCH_NEWS_RATE)
+
+    QUOTES.clear()
+    insights.INSIGHTS.clear()
+    st.cache_data.clear()
+    resilience.reset_breakers()
+    market_data.QUOTE_BACKOFF.clear()
+    history_store.HISTORY_BACKOFF.clear()
+    news.NEWS_BACKOFF.clear()
+
+
+def seed_users(n_users: int, holdings: int, password_hash: str) -> None:
+    """The bench user holds ``holdings`` tickers; everyone else holds a few."""
+    tickers = universe(max(holdings, 1000))
+    users = [(BENCH_USER, password_hash)]
+    positions = [(BENCH_USER, t, 10 + i % 90) for i, t in enumerate(tickers[:holdings])]
+    for i in range(n_users - 1):
+        name = f"user{i:06d}"
+        users.append((name, password_hash))
+        for j in range(OTHER_USER_HOLDINGS):
+            positions.append((name, tickers[(i * 7 + j * 131) % len(tickers)], 1 + j))
+
+    portfolios = {}
+    for name, ticker, shares in positions:
+        portfolios.setdefault(name, {})[ticker] = shares
+    with storage._transaction() as conn:
+        conn.executemany("INSERT INTO users (username, password) VALUES (?, ?)", users)
+        conn.executemany(
+            "INSERT OR IGNORE INTO positions (username, ticker, shares) VALUES (?, ?, ?)",
+            positions,
+        )
+        conn.executemany(
+            "INSERT INTO snapshots (username, last_trade_id, as_of, holdings) "
+            "VALUES (?, 0, NULL, ?)",
+            [(name, json.dumps(portfolios.get(name, {}))) for name, _ in users],
+        )
+    seed_symbols(tickers)
+
+
+def seed_symbols(tickers: list[str]) -> None:
+    """Bundled symbol master plus the synthetic universe, so the bench tickers
+    aren't filtered out as unlisted."""
+    path = storage.DB_PATH.with_name("symbols.csv")
+    with open(symbols.SYMBOLS_FILE, "r", encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    rows += [[t, f"Synthetic {t}", "BENCH", "equity"] for t in tickers]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f, lineterminator="\n").writerows(rows)
+    symbols.SYMBOLS.path = path
+    symbols.SYMBOLS.reload()
+
+
+def new_app(logged_in: bool = True, timeout: float = PAGE_TIMEOUT) -> AppTest:
+    at = AppTest.from_file(str(ROOT / "home.py"), default_timeout=timeout)
+    at.secrets["FINNHUB_API_KEY"] = BENCH_KEY
+    at.secrets["HF_TOKEN"] = BENCH_KEY
+    if logged_in:
+        at.session_state["user"] = BENCH_USER
+    return at
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def _login(at: AppTest) -> None:
+    at.text_input[0].input(BENCH_USER)
+    at.text_input[1].input(BENCH_PASSWORD)
+    next(b for b in at.button if b.label == "Login").click().run()
+
+
+def _generate_insights(at: AppTest) -> None:
+    next(b for b in at.button if b.label == "Generate Insights").click().run()
+    deadline = time.monotonic() + INSIGHT_TIMEOUT
+    while time.monotonic() < deadline:
+        job = insights.INSIGHT_JOBS.get(at.session_state["insight_job"])
+        if job is not None and job.finished:
+            break
+        time.sleep(0.01)
+    at.run()
+
+
+def measure_page(page: str, reruns: int, data_dir: Path, timeout: float = PAGE_TIMEOUT) -> dict:
+    drop_caches(data_dir / page)
+    stubs.CALLS.reset()
+    at = new_app(logged_in=page != "home", timeout=timeout)
+    if page != "home":
+        at.switch_page(f"pages/{page}.py")
+
+    result = {}
+    try:
+        result["cold_ms"] = round(_timed(at.run), 1)
+        warm = [_timed(at.run) for _ in range(reruns)]
+        result["rerun_ms"] = round(statistics.median(warm), 1)
+        result["rerun_max_ms"] = round(max(warm), 1)
+
+        tracemalloc.start()
+        try:
+            at.run()
+            result["peak_kib"] = tracemalloc.get_traced_memory()[1] // 1024
+        finally:
+            tracemalloc.stop()
+
+        # the page's main interaction: logging in (which lands on the dashboard),
+        # or waiting out an insight job
+        if page == "home":
+            result["action_ms"] = round(_timed(lambda: _login(at)), 1)
+        elif page == "insight":
+            result["action_ms"] = round(_timed(lambda: _generate_insights(at)), 1)
+    except RuntimeError as exc:
+        # AppTest's way of saying a run went past the timeout
+        result["timed_out"] = str(exc)
+
+    result["errors"] = [str(e.value) for e in at.exception]
+    result["calls"] = stubs.CALLS.snapshot()
+    return result
+
+
+def run_scenario(
+    n_users: int,
+    holdings: int,
+    pages: list,
+    reruns: int,
+    password_hash: str,
+    timeout: float = PAGE_TIMEOUT,
+) -> dict:
+    with tempfile.TemporaryDirectory(prefix="cportfolio-bench-") as tmp:
+        isolate(Path(tmp))
+        started = time.perf_counter()
+        seed_users(n_users, holdings, password_hash)
+        results = {"seed_ms": round((time.perf_counter() - started) * 1000, 1)}
+        for page in pages:
+            results[page] = measure_page(page, reruns, Path(tmp), timeout)
+        # connections from the pages' threads hold the files open otherwise
+        storage._local = threading.local()
+        news_store.NEWS._local = threading.local()
+    return results
+
+
+def compare(current: dict, baseline: dict) -> list[str]:
+    """Regressions of ``current`` against ``baseline``, as readable lines."""
+    problems = []
+    for scenario, pages in current["results"].items():
+        base_pages = baseline.get("results", {}).get(scenario)
+        if base_pages is None:
+            continue
+        for page, now in pages.items():
+            before = base_pages.get(page)
+            if not isinstance(now, dict) or not isinstance(before, dict):
+                continue
+            where = f"{scenario} {page}"
+            # a page that never finishes is a failure even if the baseline recorded one
+            if "timed_out" in now:
+                problems.append(f"{where}: timed out")
+                continue
+            for key in ("cold_ms", "rerun_ms", "action_ms"):
+                if key not in now or key not in before:
+                    continue
+                limit = max(before[key] * (1 + LATENCY_TOLERANCE), before[key] + LATENCY_FLOOR_MS)
+                if now[key] > limit:
+                    problems.append(f"{where}: {key} {now[key]} > {before[key]} baseline")
+            if now.get("peak_kib", 0) > before.get("peak_kib", float("inf")) * (1 + MEMORY_TOLERANCE):
+                problems.append(
+                    f"{where}: peak_kib {now['peak_kib']} > {before['peak_kib']} baseline"
+                )
+            for endpoint, count in now["calls"].items():
+                if count > before["calls"].get(endpoint, 0):
+                    problems.append(
+                        f"{where}: {endpoint} calls {count} > {before['calls'].get(endpoint, 0)}"
+                    )
+            if now["errors"] and not before["errors"]:
+                problems.append(f"{where}: new exceptions {now['errors']}")
+    return problems
+
+
+def summary(r: dict) -> str:
+    parts = [
+        f"{label} {r[key]:>9.1f} ms"
+        for key, label in (("cold_ms", "cold"), ("rerun_ms", "rerun"), ("action_ms", "action"))
+        if key in r
+    ]
+    if "peak_kib" in r:
+        parts.append(f"peak {r['peak_kib']:>8} KiB")
+    parts.append(f"calls {r['calls']}")
+    if "timed_out" in r:
+        parts.append("TIMED OUT")
+    if r["errors"]:
+        parts.append(f"ERRORS {r['errors']}")
+    return "  ".join(parts)
+
+
+def _ints(text: str) -> list[int]:
+    return [int(part) for part in text.split(",") if part.strip()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--holdings", type=_ints, default=HOLDINGS)
+    parser.add_argument("--users", type=_ints, default=USERS)
+    parser.add_argument("--pages", type=lambda s: s.split(","), default=PAGES)
+    parser.add_argument("--reruns", type=int, default=RERUNS)
+    parser.add_argument("--timeout", type=float, default=PAGE_TIMEOUT,
+                        help="seconds before a single page run counts as timed out")
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="simulated latency of every stubbed upstream call")
+    parser.add_argument("--record", type=Path, help="write results to this baseline file")
+    parser.add_argument("--check", type=Path, help="fail on regressions against this baseline")
+    args = parser.parse_args(argv)
+
+    stubs.install(latency=args.latency_ms / 1000)
+    password_hash = hash_password(BENCH_PASSWORD)
+    # the first AppTest run pays for page imports; keep that out of the numbers
+    run_scenario(1, 10, args.pages, 1, password_hash)
+
+    report = {
+        "meta": {
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "streamlit": st.__version__,
+            "reruns": args.reruns,
+            "latency_ms": args.latency_ms,
+            "timeout_s": args.timeout,
+        },
+        "results": {},
+    }
+    for n_users in args.users:
+        for holdings in args.holdings:
+            scenario = f"users={n_users} holdings={holdings}"
+            print(scenario, flush=True)
+            results = run_scenario(
+                n_users, holdings, args.pages, args.reruns, password_hash, args.timeout
+            )
+            report["results"][scenario] = results
+            for page in args.pages:
+                print(f"  {page:<10} {summary(results[page])}", flush=True)
+    stubs.uninstall()
+
+    if args.record:
+        args.record.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"baseline written to {args.record}")
+    if args.check:
+        problems = compare(report, json.loads(args.check.read_text()))
+        for line in problems:
+            print(f"REGRESSION {line}")
+        if problems:
+            return 1
+        print("no regressions against", args.check)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
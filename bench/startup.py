@@ -0,0 +1,155 @@
+"""Cold-start import budget per page.
+
+Each page runs once in a fresh interpreter, through streamlit's AppTest,
+down the paths that shouldn't need any market data:
+
+- home/cold: the login page
+- <page>/redirect: no one logged in, bounced to login
+- <page>/empty: logged in with an empty portfolio
+
+For every run it records wall time and which of services.HEAVY_MODULES got
+imported, and --check fails when a run is over its time budget or pulls in a
+heavy module its budget doesn't list.
+
+    python -m bench.startup --record bench/startup_budget.json
+    python -m bench.startup --check bench/startup_budget.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+PAGES = ("dashboard", "metrics", "insight")
+RUNS = ["home/cold"] + [f"{page}/{path}" for page in PAGES for path in ("redirect", "empty")]
+BENCH_USER = "bench"
+# budgets are recorded this much above the measured time, plus a fixed slack,
+# since a cold interpreter is noisy
+HEADROOM = 1.5
+SLACK_MS = 150
+
+
+def _measure(run: str, data_dir: Path) -> dict:
+    """Runs inside the child interpreter."""
+    from streamlit.testing.v1 import AppTest
+
+    import storage
+    from services import loaded_heavy_modules
+
+    # streamlit's own script runner has lazy imports too; pay those up front
+    AppTest.from_string("import streamlit as st\nst.title('warmup')").run()
+
+    storage.DB_PATH = data_dir / "users.db"
+    storage.LEGACY_PATHS = ()
+    storage._local = threading.local()
+    storage._CACHE.invalidate()
+    storage.create_user(BENCH_USER, "x")
+
+    page, path = run.split("/")
+    at = AppTest.from_file(str(ROOT / "home.py"), default_timeout=60)
+    at.secrets["FINNHUB_API_KEY"] = "bench"
+    at.secrets["HF_TOKEN"] = "bench"
+    if page != "home":
+        at.switch_page(f"pages/{page}.py")
+    if path == "empty":
+        at.session_state["user"] = BENCH_USER
+
+    before = set(loaded_heavy_modules())
+    start = time.perf_counter()
+    at.run()
+    elapsed = (time.perf_counter() - start) * 1000
+    return {
+        "ms": round(elapsed, 1),
+        "modules": sorted(set(loaded_heavy_modules()) - before),
+        "errors": [str(e.value) for e in at.exception],
+    }
+
+
+def measure(run: str) -> dict:
+    """One run in a fresh interpreter, so nothing is already imported."""
+    with tempfile.TemporaryDirectory(prefix="cportfolio-startup-") as tmp:
+        out = subprocess.run(
+            [sys.executable, "-m", "bench.startup", "--child", run, tmp],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def sweep(runs: list[str], repeat: int) -> dict:
+    results = {}
+    for run in runs:
+        # best of n: the noise is all on the slow side
+        samples = [measure(run) for _ in range(repeat)]
+        best = min(samples, key=lambda s: s["ms"])
+        best["modules"] = sorted({m for s in samples for m in s["modules"]})
+        results[run] = best
+        modules = ", ".join(best["modules"]) or "-"
+        print(f"  {run:<20} {best['ms']:8.1f} ms  heavy: {modules}", flush=True)
+        for error in best["errors"]:
+            print(f"    error: {error}", flush=True)
+    return results
+
+
+def budgets(results: dict) -> dict:
+    return {
+        run: {
+            "max_ms": round(r["ms"] * HEADROOM + SLACK_MS),
+            "modules": r["modules"],
+        }
+        for run, r in results.items()
+    }
+
+
+def check(results: dict, budget: dict) -> list[str]:
+    problems = []
+    for run, r in results.items():
+        limit = budget.get(run)
+        if limit is None:
+            continue
+        if r["ms"] > limit["max_ms"]:
+            problems.append(f"{run}: {r['ms']:.0f} ms over the {limit['max_ms']} ms budget")
+        extra = sorted(set(r["modules"]) - set(limit["modules"]))
+        if extra:
+            problems.append(f"{run}: imports {', '.join(extra)} at startup")
+        if r["errors"]:
+            problems.append(f"{run}: page raised {r['errors'][0]}")
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", default=",".join(RUNS), help="comma-separated page/path runs")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--record", type=Path, help="write budgets from this run")
+    parser.add_argument("--check", type=Path, help="compare against recorded budgets")
+    parser.add_argument("--child", nargs=2, metavar=("RUN", "DATA_DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run, data_dir = args.child
+        print(json.dumps(_measure(run, Path(data_dir))))
+        return 0
+
+    results = sweep([r for r in args.runs.split(",") if r], args.repeat)
+    if args.record:
+        args.record.write_text(json.dumps(budgets(results), indent=2) + "\n", encoding="utf-8")
+        print(f"budgets written to {args.record}")
+    if args.check:
+        problems = check(results, json.loads(args.check.read_text(encoding="utf-8")))
+        for problem in problems:
+            print(f"FAIL {problem}")
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""Deterministic offline stand-ins for yfinance, Finnhub and the Hugging Face
+inference client, so the pages can be driven headlessly with no network.
+
+Prices are a seeded random walk per symbol, so the same symbol and range
+always produce the same series. Every upstream call is counted in CALLS.
+"""
+import json
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import requests
+import yfinance as yf
+import huggingface_hub
+
+import insights
+from news import FINNHUB_NEWS_URL
+
+# price history starts here; anything asked for before it comes back empty
+HISTORY_START = date(2000, 1, 3)
+ARTICLES_PER_CALL = 3
+INSIGHT_CHUNKS = 40
+EXCHANGE_TZ = "America/New_York"
+
+
+class CallCounter:
+    """Thread-safe counter of upstream calls, keyed by endpoint."""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[key] += n
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(sorted(self._counts.items()))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+CALLS = CallCounter()
+# seconds each stubbed upstream call sleeps, to make concurrency visible
+LATENCY = 0.0
+
+
+def _upstream(key: str, n: int = 1) -> None:
+    CALLS.add(key, n)
+    if LATENCY:
+        time.sleep(LATENCY)
+
+
+def _weekdays(start: date, end: date) -> pd.DatetimeIndex:
+    # pd.bdate_range is slow enough to dominate the stubbed calls
+    days = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+    return pd.DatetimeIndex(days[np.is_busday(days)])
+
+
+_CALENDAR = _weekdays(HISTORY_START, date.today())
+
+
+def _closes(symbol: str, index: pd.DatetimeIndex) -> np.ndarray:
+    # walk over the whole calendar so any sub-range of the same symbol agrees
+    rng = np.random.default_rng(zlib.crc32(symbol.encode("utf-8")))
+    walk = 50 * np.cumprod(1 + rng.normal(0.0003, 0.015, len(_CALENDAR)))
+    return pd.Series(walk, index=_CALENDAR).reindex(index).to_numpy()
+
+
+def _index(start=None, end=None, period=None) -> pd.DatetimeIndex:
+    if start is None:
+        # only the short quote periods are used by the app
+        n = int(str(period or "2d").rstrip("d") or 2)
+        return _CALENDAR[-n:]
+    start = max(pd.Timestamp(start).date(), HISTORY_START)
+    # yfinance's end date is exclusive
+    end = min(pd.Timestamp(end or date.today()).date() - timedelta(days=1), date.today())
+    return _weekdays(start, end) if start <= end else _CALENDAR[:0]
+
+
+def _ohlc(symbol: str, index: pd.DatetimeIndex) -> pd.DataFrame:
+    close = _closes(symbol, index)
+    return pd.DataFrame(
+        {
+            "Open": close,
+            "High": close * 1.01,
+            "Low": close * 0.99,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": 1_000_000,
+        },
+        index=index,
+    )
+
+
+def download(tickers, start=None, end=None, period=None, group_by="column", **_):
+    symbols = [tickers] if isinstance(tickers, str) else list(tickers)
+    _upstream("yfinance.download")
+    CALLS.add("yfinance.download.symbols", len(symbols))
+    index = _index(start, end, period)
+    frames = {symbol: _ohlc(symbol, index) for symbol in symbols}
+    data = pd.concat(frames, axis=1)
+    if group_by != "ticker":
+        data = data.swaplevel(axis=1).sort_index(axis=1)
+    return data
+
+
+class Ticker:
+    def __init__(self, symbol: str):
+        self.ticker = symbol
+
+    def history(self, period=None, start=None, end=None, auto_adjust=True, **_):
+        _upstream("yfinance.history")
+        data = _ohlc(self.ticker, _index(start, end, period))
+        # like the real Ticker.history, bars come back in the exchange's timezone
+        data.index = data.index.tz_localize(EXCHANGE_TZ)
+        return data.drop(columns="Adj Close") if auto_adjust else data
+
+
+class _Response:
+    def __init__(self, payload, status_code: int = 200):
+        self._payload = payload
+        self.status_code = status_code
+        self.content = json.dumps(payload).encode("utf-8")
+
+    def json(self):
+        return self._payload
+
+
+def _session_get(session, url, params=None, **_):
+    if not url.startswith(FINNHUB_NEWS_URL):
+        raise requests.ConnectionError(f"offline benchmark: {url}")
+    _upstream("finnhub.company_news")
+    symbol = params["symbol"]
+    to_ts = int(time.mktime(date.fromisoformat(params["to"]).timetuple()))
+    articles = [
+        {
+            "id": zlib.crc32(f"{symbol}-{i}".encode("utf-8")),
+            "datetime": to_ts - i * 3600,
+            "headline": f"{symbol} headline {i}",
+            "source": "Bench Wire",
+            "url": f"https://bench.invalid/{symbol}/{params['to']}/{i}",
+            "summary": "",
+        }
+        for i in range(ARTICLES_PER_CALL)
+    ]
+    return _Response(articles)
+
+
+class InferenceClient:
+    def __init__(self, api_key=None, **_):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, max_tokens=None, stream=False, **_):
+        _upstream("huggingface.chat")
+        prompt = messages[-1]["content"]
+        CALLS.add("huggingface.prompt_chars", len(prompt))
+        chunks = [f"token{i} " for i in range(INSIGHT_CHUNKS)]
+        return iter(
+            SimpleNamespace(choices=[SimpleNamespace(delta={"content": text})])
+            for text in chunks
+        )
+
+
+_originals = []
+
+
+def install(latency: float = 0.0) -> None:
+    """Swap the stubs in; uninstall() puts the real clients back."""
+    global LATENCY
+    LATENCY = latency
+    if _originals:
+        return
+    for owner, name, stub in (
+        (yf, "download", download),
+        (yf, "Ticker", Ticker),
+        (requests.Session, "get", _session_get),
+        (huggingface_hub, "InferenceClient", InferenceClient),
+    ):
+        _originals.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, stub)
+    # clients built before install() would still hold the real objects
+    insights._clients.clear()
+
+
+def uninstall() -> None:
+    while _originals:
+        owner, name, original = _originals.pop()
+        setattr(owner, name, original)
+    insights._clients.clear()
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from services import np, pd
+
+# pixels of chart width per plotted point; anything denser can't be seen anyway
+PIXELS_PER_POINT = 2
+# the wide layout renders full-width line charts roughly this many pixels across
+DEFAULT_CHART_WIDTH = 1200
+# a chart in one of two side-by-side st.columns
+HALF_CHART_WIDTH = DEFAULT_CHART_WIDTH // 2
+MIN_POINTS = 50
+
+
+def target_points(chart_width: int = DEFAULT_CHART_WIDTH) -> int:
+    return max(MIN_POINTS, chart_width // PIXELS_PER_POINT)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of ``n_out`` points that keep the
+    visual shape of (x, y). First and last points are always kept."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = x.astype(float)
+    y = y.astype(float)
+    # bucket boundaries for the n - 2 interior points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # average of the next bucket (or the last point) is the third vertex
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        ax, ay = x[a], y[a]
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((ax - cx) * (by - ay) - (ax - bx) * (cy - ay))
+        a = lo + int(np.nanargmax(area)) if len(area) else lo
+        keep[i + 1] = a
+    return keep
+
+
+def downsample_long(
+    df: pd.DataFrame,
+    x: str,
+    y: str,
+    series: str | None = None,
+    n_out: int | None = None,
+    chart_width: int = DEFAULT_CHART_WIDTH,
+) -> pd.DataFrame:
+    """LTTB-reduce a long-form chart frame per series before it's handed to Altair.
+
+    Retained rows are the original rows, so tooltips stay exact; the payload is
+    capped at ``n_out`` points per series (by default what ``chart_width`` pixels
+    can show) however long the history is.
+    """
+    n_out = n_out or target_points(chart_width)
+    groups = [df] if series is None else [g for _, g in df.groupby(series, sort=False)]
+    parts = []
+    for group in groups:
+        group = group.dropna(subset=[y]).sort_values(x)
+        if len(group) <= n_out:
+            parts.append(group)
+            continue
+        xs = group[x]
+        xs = xs.astype("int64").to_numpy() if pd.api.types.is_datetime64_any_dtype(xs) else xs.to_numpy()
+        parts.append(group.iloc[lttb_indices(xs, group[y].to_numpy(), n_out)])
+    if not parts:
+        return df.iloc[0:0]
+    return pd.concat(parts, ignore_index=True)
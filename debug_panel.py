@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import streamlit as st
+
+from instrumentation import ENABLED, REGISTRY, quantile, write_prometheus
+from quote_cache import QUOTES
+from resilience import open_endpoints
+from services import pd
+
+# comma-separated usernames that get the sidebar debug panel
+ADMINS = frozenset(
+    name.strip() for name in os.environ.get("CPORTFOLIO_ADMINS", "").split(",") if name.strip()
+)
+METRICS_FILE = Path(
+    os.environ.get(
+        "CPORTFOLIO_METRICS_FILE",
+        Path(__file__).resolve().parent / "data" / "metrics.prom",
+    )
+)
+
+
+def is_admin(user: str | None) -> bool:
+    return user in ADMINS
+
+
+def _label_text(labels: tuple) -> str:
+    return ", ".join(f"{k}={v}" for k, v in labels)
+
+
+def timings_frame(snapshot: dict) -> pd.DataFrame:
+    rows = []
+    for (name, labels), hist in sorted(snapshot["histograms"].items()):
+        if not name.endswith("_seconds") or not hist["count"]:
+            continue
+        rows.append(
+            {
+                "Span": name.removesuffix("_seconds"),
+                "Labels": _label_text(labels),
+                "Calls": hist["count"],
+                "Mean (ms)": hist["sum"] / hist["count"] * 1000,
+                "p95 ≤ (ms)": quantile(hist, 0.95) * 1000,
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def counters_frame(snapshot: dict) -> pd.DataFrame:
+    return pd.DataFrame(
+        [
+            {"Counter": name, "Labels": _label_text(labels), "Value": value}
+            for (name, labels), value in sorted(snapshot["counters"].items())
+        ]
+    )
+
+
+def render_debug_panel(user: str | None) -> None:
+    """Sidebar view of the process-wide instrumentation, for admins only."""
+    if not is_admin(user):
+        return
+    with st.sidebar.expander("Debug metrics"):
+        if not ENABLED:
+            st.caption("Instrumentation is off. Set CPORTFOLIO_METRICS=1 and restart.")
+            return
+        snapshot = REGISTRY.snapshot()
+        st.dataframe(timings_frame(snapshot), hide_index=True, use_container_width=True)
+        st.dataframe(counters_frame(snapshot), hide_index=True, use_container_width=True)
+        stats = QUOTES.stats()
+        st.caption(
+            f"Quote cache: {stats['size']} symbols, {stats['hits']} hits, {stats['misses']} misses"
+        )
+        st.caption(f"Open circuits: {', '.join(open_endpoints()) or 'none'}")
+        st.download_button(
+            "Download Prometheus metrics",
+            REGISTRY.prometheus_text(),
+            file_name="cportfolio.prom",
+            mime="text/plain",
+            use_container_width=True,
+        )
+        if st.button("Write metrics file", use_container_width=True):
+            st.caption(f"Wrote {write_prometheus(METRICS_FILE)}")
+        if st.button("Reset metrics", use_container_width=True):
+            REGISTRY.clear()
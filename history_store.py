@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, timedelta
+from pathlib import Path
+
+from instrumentation import cache_result, timed
+from market_data import download_history
+from resilience import Backoff, BreakerOpen
+from services import feather, pa, pd
+
+# one uncompressed Feather file per symbol so reads can be memory-mapped
+HISTORY_DIR = Path(__file__).resolve().parent / "data" / "history"
+# today's bar keeps changing until the close, so only trust it for a while
+OPEN_TAIL_TTL = 60 * 60
+# an empty download this short is just a weekend/holiday, anything longer is a failure
+MAX_EMPTY_GAP_DAYS = 6
+
+# bounded pool for loading several symbols' history at once
+HISTORY_WORKERS = 8
+# stop waiting on stragglers after this many seconds and return what arrived
+HISTORY_DEADLINE = 30
+
+# relative change in an already-stored adjusted close that means a new split/dividend basis
+REBASE_TOLERANCE = 1e-4
+
+ONE_DAY = timedelta(days=1)
+
+# symbols whose download failed or came back empty for a real range (delisted,
+# renamed) serve what's on disk and back off instead of retrying every rerun
+HISTORY_BACKOFF = Backoff("history")
+
+
+def _naive_dates(index) -> pd.DatetimeIndex:
+    # stored rows are tz-naive; a tz-aware piece would turn the merged index into objects
+    index = pd.DatetimeIndex(pd.to_datetime(index))
+    return index.tz_localize(None) if index.tz is not None else index
+
+
+def _anchor(series: pd.Series, gap_start: date, gap_end: date) -> pd.Timestamp | None:
+    """The stored date next to a gap: the first one for a head gap, else the last before it."""
+    if series.empty:
+        return None
+    if series.index[0] > pd.Timestamp(gap_end):
+        return series.index[0]
+    before = series.index[series.index < pd.Timestamp(gap_start)]
+    return before[-1] if len(before) else None
+
+
+def _rebased(stored: pd.Series, fetched: pd.Series, anchor: pd.Timestamp | None) -> bool:
+    # adjusted closes are restated back through history after every split or
+    # dividend, so the overlapping close only changes when the basis did
+    if anchor is None or anchor not in fetched.index or not stored[anchor]:
+        return False
+    return abs(fetched[anchor] / stored[anchor] - 1) > REBASE_TOLERANCE
+
+
+class HistoryStore:
+    """On-disk daily close store that only downloads date ranges it doesn't hold yet.
+
+    Each symbol gets ``<SYMBOL>.feather`` with the closes and ``<SYMBOL>.json``
+    recording the contiguous date range already covered. Every download overlaps
+    one stored close; if that close moved, a split or dividend restated the
+    adjusted history and the whole held range is fetched again.
+    """
+
+    def __init__(self, root: Path = HISTORY_DIR, downloader=download_history):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.downloader = downloader
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, symbol: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(symbol, threading.Lock())
+
+    def _paths(self, symbol: str) -> tuple[Path, Path]:
+        safe = symbol.replace("/", "_").replace("^", "_")
+        return self.root / f"{safe}.feather", self.root / f"{safe}.json"
+
+    def coverage(self, symbol: str) -> dict | None:
+        _, meta_path = self._paths(symbol)
+        if not meta_path.exists():
+            return None
+        with meta_path.open("r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return {
+            "start": date.fromisoformat(meta["start"]),
+            "end": date.fromisoformat(meta["end"]),
+            "fetched_at": meta.get("fetched_at", 0.0),
+        }
+
+    def read(self, symbol: str) -> pd.Series:
+        """Everything stored for a symbol, read through a memory map."""
+        data_path, _ = self._paths(symbol)
+        if not data_path.exists():
+            return pd.Series(dtype=float, name=symbol)
+        table = feather.read_table(data_path, memory_map=True)
+        frame = table.to_pandas()
+        return frame.set_index("Date")["Close"].rename(symbol)
+
+    def _write(
+        self, symbol: str, series: pd.Series, start: date, end: date, fetched_at: float
+    ) -> None:
+        data_path, meta_path = self._paths(symbol)
+        frame = pd.DataFrame({"Date": series.index, "Close": series.to_numpy(dtype=float)})
+        tmp_data = data_path.with_suffix(".feather.tmp")
+        feather.write_feather(
+            pa.Table.from_pandas(frame, preserve_index=False),
+            tmp_data,
+            compression="uncompressed",
+        )
+        os.replace(tmp_data, data_path)
+
+        tmp_meta = meta_path.with_suffix(".json.tmp")
+        with tmp_meta.open("w", encoding="utf-8") as f:
+            json.dump(
+                {"start": start.isoformat(), "end": end.isoformat(), "fetched_at": fetched_at},
+                f,
+            )
+        os.replace(tmp_meta, meta_path)
+
+    def missing_ranges(self, symbol: str, start: date, end: date) -> list[tuple[date, date]]:
+        """Head/tail ranges that still need downloading to cover [start, end]."""
+        cov = self.coverage(symbol)
+        if cov is None:
+            return [(start, end)]
+        held_start, held_end = cov["start"], cov["end"]
+        # the bar for the day of the fetch may have been taken before the close,
+        # so once that's stale re-fetch from that day, even if it's long past
+        fetched_on = date.fromtimestamp(cov["fetched_at"])
+        if held_end >= fetched_on and time.time() - cov["fetched_at"] > OPEN_TAIL_TTL:
+            held_end = fetched_on - ONE_DAY
+
+        gaps = []
+        # gaps always touch the held range so coverage stays contiguous
+        if start < held_start:
+            gaps.append((start, held_start - ONE_DAY))
+        if end > held_end:
+            gaps.append((held_end + ONE_DAY, end))
+        return gaps
+
+    def get(self, symbol: str, start: date, end: date) -> pd.Series:
+        """Closes for [start, end], downloading only the ranges not already on disk."""
+        with self._lock(symbol):
+            series = self.read(symbol)
+            gaps = self.missing_ranges(symbol, start, end)
+            cache_result("history", hits=0 if gaps else 1, misses=1 if gaps else 0)
+            if gaps and HISTORY_BACKOFF.blocked(symbol):
+                gaps = []
+            if gaps:
+                cov = self.coverage(symbol)
+                held = (cov["start"], cov["end"]) if cov else None
+                # fetched_at dates the newest bar, so only a fetched tail moves it
+                fetched_at = cov["fetched_at"] if cov else time.time()
+                pieces = [series] if not series.empty else []
+                changed = False
+                rebased = False
+                for gap_start, gap_end in gaps:
+                    anchor = _anchor(series, gap_start, gap_end)
+                    fetch_start, fetch_end = gap_start, gap_end
+                    if anchor is not None:
+                        # overlap one stored close to check the adjustment basis
+                        fetch_start = min(gap_start, anchor.date())
+                        fetch_end = max(gap_end, anchor.date())
+                    try:
+                        fetched = self.downloader(symbol, fetch_start, fetch_end)
+                    except BreakerOpen:
+                        # the endpoint is down, not this symbol; serve what's on disk
+                        break
+                    empty_ok = (gap_end - gap_start).days <= MAX_EMPTY_GAP_DAYS
+                    if fetched is None or (fetched.empty and not empty_ok):
+                        # don't claim coverage we failed to get
+                        HISTORY_BACKOFF.failure(symbol)
+                        continue
+                    HISTORY_BACKOFF.success(symbol)
+                    changed = True
+                    if held is None or gap_end >= held[1]:
+                        fetched_at = time.time()
+                    if not fetched.empty:
+                        fetched.index = _naive_dates(fetched.index)
+                        pieces.append(fetched)
+                        rebased = rebased or _rebased(series, fetched, anchor)
+                    # gaps touch the held range, so extending it keeps it contiguous
+                    held = (
+                        (min(held[0], gap_start), max(held[1], gap_end))
+                        if held
+                        else (gap_start, gap_end)
+                    )
+                if changed and rebased:
+                    # a split or dividend since the stored rows were fetched moved every
+                    # adjusted close, so replace them rather than stitch two bases together
+                    try:
+                        full = self.downloader(symbol, held[0], held[1])
+                    except BreakerOpen:
+                        full = None
+                    if full is None or full.empty:
+                        changed = False
+                    else:
+                        full.index = _naive_dates(full.index)
+                        pieces = [full]
+                        fetched_at = time.time()
+                if changed and pieces:
+                    merged = pd.concat(pieces)
+                    # a refetched tail replaces the stale rows it overlaps
+                    merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+                    series = merged.rename(symbol)
+                if changed:
+                    self._write(symbol, series, held[0], held[1], fetched_at)
+
+        if series.empty:
+            return series
+        return series.loc[pd.Timestamp(start):pd.Timestamp(end)]
+
+
+# shared by every session in the server process
+HISTORY = HistoryStore()
+# process-wide, so downloads still running at a caller's deadline carry on
+# after it returns instead of being cancelled with a per-call pool
+HISTORY_POOL = ThreadPoolExecutor(max_workers=HISTORY_WORKERS, thread_name_prefix="history")
+
+
+@timed("fetch_history")
+def load_history_frame(
+    tickers,
+    start: date,
+    end: date,
+    store: HistoryStore = HISTORY,
+    pool: ThreadPoolExecutor = HISTORY_POOL,
+    deadline: float = HISTORY_DEADLINE,
+    timed_out: list | None = None,
+    fill: bool = True,
+) -> tuple[pd.DataFrame, list[str]]:
+    """Aligned (date x ticker) closes for every ticker, loaded concurrently in one pass.
+
+    Returns the frame and the tickers that failed or missed the deadline.
+    Pass a list as ``timed_out`` to learn which ones only missed the deadline;
+    they keep loading on the shared pool and will be there on a later call.
+    ``fill=False`` skips the forward fill, for callers that slice per-user
+    subsets out of one frame and fill those themselves.
+    """
+    symbols = list(dict.fromkeys(tickers))
+    if not symbols:
+        return pd.DataFrame(), []
+
+    futures = {pool.submit(store.get, ticker, start, end): ticker for ticker in symbols}
+    done, not_done = wait(futures, timeout=deadline)
+    if timed_out is not None:
+        timed_out.extend(futures[future] for future in not_done)
+    # don't hold the page on stragglers; the shared pool finishes them (and
+    # everything still queued behind them) and they land on disk
+
+    columns = {}
+    for future in done:
+        try:
+            series = future.result()
+        except Exception:
+            continue
+        if not series.empty:
+            columns[futures[future]] = series
+
+    failed = [t for t in symbols if t not in columns]
+    if not columns:
+        return pd.DataFrame(), failed
+    prices = pd.DataFrame(columns)[[t for t in symbols if t in columns]]
+    prices = prices.sort_index()
+    if fill:
+        prices = prices.ffill()
+    return prices.dropna(how="all"), failed
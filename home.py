@@ -1,12 +1,10 @@
 import json, os
 from pathlib import Path
 import streamlit as st
-from security import hash_password, verify_password
-from storage import load_users, save_users
+from security import hash_password, verify_login
+from storage import create_user, get_user, set_password
 
-st.set_page_config(page_title="Cportfolio", page_icon="", layout="wide")
-#  load in user data
-USERS = load_users()
+st.set_page_config(page_title="Cportfolio", layout="wide")
 # Folder that contains app.py
 #BASE_DIR = Path(__file__).resolve().parent
 
@@ -34,7 +32,14 @@ username = st.text_input("Username")
 password = st.text_input("Password", type="password")
 
 if st.button("Login", use_container_width=True):
-    if username in USERS and verify_password(USERS[username]["password"], password):
+    record = get_user(username)
+    result = verify_login(username, record["password"] if record else None, password)
+    if result.throttled:
+        st.error("Too many failed attempts. Please wait a few minutes and try again.")
+    elif result.ok:
+        # hash was made with an older cost profile, swap in the current one
+        if result.new_hash:
+            set_password(username, result.new_hash)
         # set session state and redirect
         st.session_state.user = username
         st.success("Login successful! Redirecting...")
@@ -50,21 +55,16 @@ new_pass = st.text_input("Choose a password", type="password", key="signup_pass"
 new_pass2 = st.text_input("Confirm password", type="password", key="signup_pass2")
 
 if st.button("Create account", use_container_width=True):
-    users = load_users()
-
     # basic password validation
     if not new_user.strip():
         st.error("Username cannot be empty.")
-    elif new_user in users:
+    elif get_user(new_user) is not None:
         st.error("That username is already taken.")
     elif len(new_pass) < 8:
         st.error("Password must be at least 8 characters.")
     elif new_pass != new_pass2:
         st.error("Passwords do not match.")
+    elif not create_user(new_user, hash_password(new_pass)):
+        st.error("That username is already taken.")
     else:
-        users[new_user] = {
-            "password": hash_password(new_pass),
-            "portfolio": {}
-        }
-        save_users(users)
         st.success("Account created! You can log in now.")
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from datetime import date
+
+import streamlit as st
+
+from market_data import get_quotes
+from portfolio_import import parse_lots
+from services import pd
+from storage import import_trades
+
+
+# in a module rather than the page so streamlit doesn't recompile it on every
+# script run, and as a fragment so the upload and preview don't rerun the page
+@st.fragment
+def render_import_panel(user: str) -> None:
+    """Upload, preview and commit a CSV or broker export for ``user``."""
+    with st.expander("Import positions from a CSV or broker export"):
+        imported = st.session_state.pop("import_message", None)
+        if imported:
+            st.success(imported)
+        upload = st.file_uploader(
+            "CSV file",
+            type=["csv", "txt"],
+            help="Needs a symbol and a quantity column; trade date and buy/sell columns are used when present.",
+            key="import_file",
+        )
+        if upload is None:
+            st.session_state.pop("import_result", None)
+            return
+
+        # parse once per uploaded file, not on every rerun of the fragment
+        cached = st.session_state.get("import_result")
+        if cached is None or cached[0] != upload.file_id:
+            progress = st.progress(0.0, text="Reading file...")
+            result = parse_lots(
+                upload,
+                total_bytes=upload.size,
+                on_progress=lambda done, rows: progress.progress(done, text=f"Read {rows:,} rows"),
+                # symbols missing from the symbol list are checked in one batched quote fetch
+                verify=lambda symbols: list(get_quotes(symbols)),
+            )
+            progress.empty()
+            st.session_state.import_result = (upload.file_id, result)
+        else:
+            result = cached[1]
+
+        as_of = None
+        if result.undated():
+            # position lists carry no dates; without one they'd all start today
+            # and the metrics page would have no history to backtest
+            as_of = st.date_input(
+                f"Held since, for the {result.undated():,} rows without a trade date",
+                value=date.today(),
+                max_value=date.today(),
+                key="import_as_of",
+            )
+        trades = result.trades(as_of)
+        st.caption(
+            f"{result.rows:,} rows: {len(result.lots):,} lots in {len(result.tickers()):,} symbols, "
+            f"{result.rejected_count:,} rejected, {result.ignored:,} not trades"
+        )
+        if result.rejected:
+            st.warning(f"{result.rejected_count:,} rows can't be imported.")
+            st.dataframe(
+                pd.DataFrame(result.rejected, columns=["Line", "Value", "Problem"]),
+                hide_index=True,
+                use_container_width=True,
+            )
+        if not trades:
+            return
+        preview = pd.DataFrame(result.net_positions().items(), columns=["Ticker", "Net Shares"])
+        st.dataframe(preview, hide_index=True, use_container_width=True)
+
+        if st.button(f"Import {len(trades):,} trades", use_container_width=True):
+            # one write transaction for the whole file
+            applied = import_trades(user, trades)
+            # then one batched download warms the quote cache for the new tickers
+            with st.spinner("Fetching prices..."):
+                get_quotes(result.tickers())
+            st.session_state.pop("import_result", None)
+            message = f"Imported {applied['buy']:,} buys and {applied['sell']:,} sells."
+            if applied["skipped"]:
+                message += f" Skipped {applied['skipped']:,} sells of positions you don't hold."
+            st.session_state.import_message = message
+            st.rerun()
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from instrumentation import cache_result, response_size, span, upstream
+from jobs import JobQueue
+from services import huggingface_hub
+
+MODEL = "HuggingFaceH4/zephyr-7b-beta:featherless-ai"
+MAX_TOKENS = 250
+# identical holdings get the same answer back for this long
+INSIGHT_TTL = 6 * 3600
+MAX_CACHED_INSIGHTS = 1000
+# how many inference calls the whole server makes at once
+MAX_CONCURRENT_INSIGHTS = 4
+
+
+def build_prompt(payload: dict) -> str:
+    #make the prompt , this prompt was designed for this use case. 
+    return f"""
+You are a calm, neutral portfolio analyst.
+
+Given the following JSON describing a user's stock holdings, do NOT give financial advice.
+Instead, do this:
+
+1. Give 3–6 bullet-point **insights** about:
+   - concentration vs diversification
+   - any unusually large positions
+   - anything interesting about the mix of tickers (e.g. large cap vs others, tech-heavy, etc.)
+
+2. Give 2–3 **popular narratives** or themes that investors often talk about
+   for portfolios like this (e.g. “big tech growth focus”, “EV-heavy exposure”, etc.).
+   Keep them generic, not as recommendations.
+
+3. Give 2–3 **risks to watch**, phrased cautiously.
+
+Important rules:
+- DO NOT tell the user what they *should* buy or sell.
+- DO NOT mention that you are an AI; just speak like an analyst.
+- Use markdown with headings and bullet points.
+- Be concise.
+
+JSON:
+{json.dumps(_prompt_payload(payload), indent=2)}
+"""
+
+
+def _prompt_payload(payload: dict) -> dict:
+    # only what cache_key() hashes goes to the model, so a cached answer can
+    # be served to anyone with the same holdings
+    return {"holdings": payload.get("holdings", [])}
+
+
+def cache_key(payload: dict, model: str = MODEL) -> str:
+    """Canonical hash of the holdings and model, the only inputs the prompt carries."""
+    holdings = sorted((h["ticker"], h["shares"]) for h in payload.get("holdings", []))
+    blob = json.dumps({"model": model, "holdings": holdings}, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class InsightCache:
+    """Bounded TTL cache of finished responses, least recently used evicted first."""
+
+    def __init__(self, ttl: float = INSIGHT_TTL, max_entries: int = MAX_CACHED_INSIGHTS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (stored_at, text)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] >= self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: str, text: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+INSIGHTS = InsightCache()
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(hf_token: str) -> huggingface_hub.InferenceClient:
+    """One InferenceClient per token for the whole process."""
+    with _clients_lock:
+        if hf_token not in _clients:
+            _clients[hf_token] = huggingface_hub.InferenceClient(api_key=hf_token)
+        return _clients[hf_token]
+
+
+def stream_insights(payload: dict, hf_token: str, cache: InsightCache = INSIGHTS):
+    """Yield the response text as it's generated, or all at once from the cache."""
+    key = cache_key(payload)
+    cached = cache.get(key)
+    if cached is not None:
+        cache_result("insights", hits=1)
+        yield cached
+        return
+    cache_result("insights", misses=1)
+
+    prompt = build_prompt(payload)
+    upstream("huggingface_chat")
+    parts = []
+    # covers the whole stream, not just the time to the first token
+    with span("upstream", endpoint="huggingface_chat"):
+        stream = get_client(hf_token).chat.completions.create(
+            model=MODEL,
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt,
+                }
+            ],
+            max_tokens=MAX_TOKENS,
+            stream=True,
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            text = delta.get("content") if isinstance(delta, dict) else getattr(delta, "content", None)
+            if text:
+                parts.append(text)
+                yield text
+    answer = "".join(parts).strip()
+    response_size("huggingface_chat", len(answer.encode("utf-8")))
+    # only a fully streamed answer is cached
+    cache.put(key, answer)
+
+
+INSIGHT_JOBS = JobQueue(MAX_CONCURRENT_INSIGHTS, name="insights")
+
+
+def submit_insights(payload: dict, hf_token: str) -> str:
+    """Queue generation in the background; the same holdings share one in-flight job."""
+    return INSIGHT_JOBS.submit(cache_key(payload), stream_insights, payload, hf_token)
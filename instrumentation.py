@@ -0,0 +1,233 @@
+import functools
+import os
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# off unless asked for, so production pays nothing for it
+ENABLED = os.environ.get("CPORTFOLIO_METRICS", "").lower() in ("1", "true", "yes")
+# seconds; roughly prometheus' default latency buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# response sizes in bytes
+SIZE_BUCKETS = (10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+METRICS_PREFIX = "cportfolio"
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        # caller holds the registry lock
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Registry:
+    """Process-wide counters and histograms, keyed by (name, labels)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name: str, n: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def observe(self, name: str, value: float, buckets: tuple = LATENCY_BUCKETS, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> dict:
+        """{"counters": {(name, labels): value}, "histograms": {(name, labels): {...}}}"""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "histograms": {
+                    key: {
+                        "count": h.count,
+                        "sum": h.sum,
+                        "buckets": list(zip(h.buckets + (float("inf"),), h.counts)),
+                    }
+                    for key, h in self._histograms.items()
+                },
+            }
+
+    def prometheus_text(self) -> str:
+        """Everything in the Prometheus text exposition format."""
+        snap = self.snapshot()
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(snap["counters"].items()):
+            metric = f"{METRICS_PREFIX}_{name}_total"
+            header(metric, "counter")
+            lines.append(f"{metric}{_labels(labels)} {value:g}")
+        for (name, labels), hist in sorted(snap["histograms"].items()):
+            metric = f"{METRICS_PREFIX}_{name}"
+            header(metric, "histogram")
+            cumulative = 0
+            for bound, count in hist["buckets"]:
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{metric}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{metric}_sum{_labels(labels)} {hist['sum']:g}")
+            lines.append(f"{metric}_count{_labels(labels)} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def quantile(hist: dict, q: float) -> float:
+    """Upper bucket bound holding the q-th quantile of a snapshot() histogram."""
+    target = q * hist["count"]
+    seen = 0
+    for bound, count in hist["buckets"]:
+        seen += count
+        if seen >= target:
+            return bound
+    return float("inf")
+
+
+REGISTRY = Registry()
+
+
+class _Span:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        labels = dict(self.labels, outcome="error" if exc_type else "ok")
+        REGISTRY.observe(f"{self.name}_seconds", time.perf_counter() - self.start, **labels)
+        return False
+
+
+_NULL_SPAN = nullcontext()
+
+
+def span(name: str, **labels):
+    """``with span("news_fetch"):`` records the block's duration when enabled."""
+    return _Span(name, labels) if ENABLED else _NULL_SPAN
+
+
+def timed(name: str, **labels):
+    """Decorator form of span(). When instrumentation is off the function is
+    returned untouched, so there's no per-call cost at all."""
+
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Span(name, labels):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def count(name: str, n: float = 1, **labels) -> None:
+    if ENABLED and n:
+        REGISTRY.inc(name, n, **labels)
+
+
+def cache_result(cache: str, hits: int = 0, misses: int = 0) -> None:
+    if ENABLED:
+        if hits:
+            REGISTRY.inc("cache_hits", hits, cache=cache)
+        if misses:
+            REGISTRY.inc("cache_misses", misses, cache=cache)
+
+
+def upstream(endpoint: str) -> None:
+    """Count one call (successful or not) to an external service."""
+    if ENABLED:
+        REGISTRY.inc("upstream_calls", endpoint=endpoint)
+
+
+def response_size(endpoint: str, size: float | None) -> None:
+    """Record the size of a response that came back."""
+    if ENABLED and size is not None:
+        REGISTRY.observe("upstream_payload_bytes", size, SIZE_BUCKETS, endpoint=endpoint)
+
+
+def write_prometheus(path) -> Path:
+    """Dump the registry to ``path`` for a node-exporter textfile collector."""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(REGISTRY.prometheus_text(), encoding="utf-8")
+    tmp.replace(path)
+    return path
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = REGISTRY.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def serve(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics locally from a daemon thread; later calls reuse the first server."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        return _server
+
+
+if ENABLED and os.environ.get("CPORTFOLIO_METRICS_PORT"):
+    serve(int(os.environ["CPORTFOLIO_METRICS_PORT"]))
@@ -0,0 +1,84 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+# finished jobs stay readable for this long so later reruns can still render them
+JOB_RETENTION = 3600
+
+
+@dataclass
+class Job:
+    id: str
+    key: str
+    state: str = "queued"  # queued -> running -> done | failed
+    partial: str = ""
+    result: object = None
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "failed")
+
+
+class JobQueue:
+    """Small background job runner with a concurrency cap.
+
+    submit() returns immediately with a job id. Submitting a key that already
+    has a queued or running job hands back that job's id instead of starting
+    another. If the job function returns an iterator of strings it's consumed
+    chunk by chunk into ``job.partial`` so pollers can show progress.
+    """
+
+    def __init__(self, max_workers: int, name: str = "jobs"):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._jobs = {}
+        self._active = {}  # key -> job id while queued or running
+        self._lock = threading.Lock()
+
+    def submit(self, key: str, fn, *args) -> str:
+        with self._lock:
+            self._prune()
+            if key in self._active:
+                return self._active[key]
+            job = Job(id=uuid.uuid4().hex, key=key)
+            self._jobs[job.id] = job
+            self._active[key] = job.id
+        self.pool.submit(self._run, job, fn, args)
+        return job.id
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: Job, fn, args) -> None:
+        job.state = "running"
+        try:
+            result = fn(*args)
+            if hasattr(result, "__next__"):
+                for chunk in result:
+                    job.partial += chunk
+                result = job.partial
+            job.result = result
+            job.state = "done"
+        except Exception as exc:
+            job.error = str(exc)
+            job.state = "failed"
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._active.pop(job.key, None)
+
+    def _prune(self) -> None:
+        # caller holds the lock
+        cutoff = time.time() - JOB_RETENTION
+        stale = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in stale:
+            del self._jobs[job_id]
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from instrumentation import cache_result, response_size, span, timed, upstream
+from providers import get_provider
+from quote_cache import QUOTES
+from resilience import Backoff, breaker
+from services import pd
+from singleflight import SingleFlight
+
+# how many symbols go into one multi-ticker download call
+QUOTE_CHUNK_SIZE = 100
+# cap on the per-symbol fallback so a bad batch can't open hundreds of connections
+FALLBACK_WORKERS = 8
+# per-symbol request timeout (seconds) for history downloads
+HISTORY_TIMEOUT = 10
+
+# concurrent sessions asking for the same symbol share one upstream call.
+# quotes are always the same 2d/1d window, so they're keyed by symbol alone
+QUOTE_FLIGHTS = SingleFlight("quotes")
+# history is keyed by (symbol, start, end, interval)
+HISTORY_FLIGHTS = SingleFlight("history")
+# symbols upstream answered for without a quote (delisted, halted) back off
+# instead of costing a fallback call on every rerun
+QUOTE_BACKOFF = Backoff("quotes")
+
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _close_frame(data, tickers: list[str], field: str = "Close") -> pd.DataFrame:
+    """Pull a (date x ticker) frame of one price field out of a yf.download result."""
+    if data is None or getattr(data, "empty", True):
+        return pd.DataFrame()
+    if isinstance(data.columns, pd.MultiIndex):
+        # group_by="ticker" puts the ticker on level 0, newer yfinance may flip it
+        for level in range(data.columns.nlevels):
+            if field in data.columns.get_level_values(level):
+                closes = data.xs(field, level=level, axis=1)
+                break
+        else:
+            return pd.DataFrame()
+    elif field in data.columns and len(tickers) == 1:
+        closes = data[[field]]
+        closes.columns = list(tickers)
+    else:
+        return pd.DataFrame()
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(tickers[0])
+    return closes
+
+
+def _frame_bytes(data) -> int | None:
+    return None if data is None else int(data.memory_usage(index=True).sum())
+
+
+def _quote_from_closes(closes: pd.Series) -> dict | None:
+    closes = closes.dropna()
+    if closes.empty:
+        return None
+    current = float(closes.iloc[-1])
+    prev = float(closes.iloc[-2]) if len(closes) > 1 else float("nan")
+    return {"price": current, "prev_close": prev}
+
+
+def _download_quotes(tickers: list[str]) -> dict:
+    """One multi-symbol download for the whole list, parsed into {ticker: quote}."""
+    provider = get_provider()
+    endpoint = f"{provider.name}_download"
+    circuit = breaker(endpoint)
+    if not circuit.allow():
+        return {}
+    upstream(endpoint)
+    try:
+        with span("upstream", endpoint=endpoint):
+            data = provider.download(tickers, period="2d", interval="1d")
+    except Exception:
+        circuit.failure()
+        return {}
+    circuit.success()
+    response_size(endpoint, _frame_bytes(data))
+    closes = _close_frame(data, tickers)
+    quotes = {}
+    for ticker in tickers:
+        if ticker not in closes.columns:
+            continue
+        quote = _quote_from_closes(closes[ticker])
+        if quote is not None:
+            quotes[ticker] = quote
+    return quotes
+
+
+def _ticker_quote(ticker: str) -> dict | None:
+    """Single-symbol fallback, safe to run from a thread pool.
+
+    None when the call failed or wasn't made, {} when upstream had no quote.
+    """
+    provider = get_provider()
+    endpoint = f"{provider.name}_history"
+    circuit = breaker(endpoint)
+    if not circuit.allow():
+        return None
+    upstream(endpoint)
+    try:
+        with span("upstream", endpoint=endpoint):
+            history = provider.history(ticker, period="2d", interval="1d")
+    except Exception:
+        circuit.failure()
+        return None
+    circuit.success()
+    response_size(endpoint, _frame_bytes(history))
+    closes = _close_frame(history, [ticker])
+    if ticker not in closes.columns:
+        return {}
+    quote = _quote_from_closes(closes[ticker])
+    return {ticker: quote} if quote is not None else {}
+
+
+def fetch_quotes(
+    tickers,
+    chunk_size: int = QUOTE_CHUNK_SIZE,
+    max_workers: int = FALLBACK_WORKERS,
+) -> dict:
+    """Latest and previous close per ticker, fetched in chunked multi-symbol downloads.
+
+    Symbols another session is already fetching are waited on rather than
+    requested again, so upstream load follows distinct symbols, not sessions.
+    Symbols still backing off after coming back empty are skipped.
+    """
+    symbols = [tickers] if isinstance(tickers, str) else list(tickers or [])
+    symbols, _ = QUOTE_BACKOFF.partition(dict.fromkeys(symbols))
+    return QUOTE_FLIGHTS.do_many(
+        symbols, lambda owned: _fetch_quotes(owned, chunk_size, max_workers)
+    )
+
+
+def _fetch_quotes(symbols: list[str], chunk_size: int, max_workers: int) -> dict:
+    """Symbols the batch call comes back without are retried one by one on a
+    small thread pool."""
+    quotes = {}
+    for chunk in _chunks(symbols, chunk_size):
+        quotes.update(_download_quotes(chunk))
+
+    missing = [t for t in symbols if t not in quotes]
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as pool:
+            for ticker, result in zip(missing, pool.map(_ticker_quote, missing)):
+                if result is None:
+                    continue
+                if not result:
+                    QUOTE_BACKOFF.failure(ticker)
+                quotes.update(result)
+    for ticker in quotes:
+        QUOTE_BACKOFF.success(ticker)
+    return quotes
+
+
+@timed("fetch_prices")
+def get_quotes(tickers, cache=QUOTES) -> dict:
+    """Quotes served from the shared per-symbol cache, fetching only stale or unseen tickers.
+
+    Symbols with no data come back absent and back off (QUOTE_BACKOFF) instead
+    of being asked for again on every run.
+    """
+    symbols = [tickers] if isinstance(tickers, str) else list(tickers or [])
+    quotes, missing = cache.get_many(dict.fromkeys(symbols))
+    cache_result("quotes", hits=len(quotes), misses=len(missing))
+    if missing:
+        fetched = fetch_quotes(missing)
+        cache.put_many(fetched)
+        quotes.update(fetched)
+    return quotes
+
+
+def download_history(
+    symbol: str, start: date, end: date, timeout: float = HISTORY_TIMEOUT
+) -> pd.Series | None:
+    """Daily adjusted closes for one symbol over [start, end], None if the call failed.
+
+    Identical concurrent requests share one upstream call. Raises BreakerOpen
+    instead of calling while the history endpoint is failing.
+    """
+    return HISTORY_FLIGHTS.do(
+        (symbol, start, end, "1d"), _download_history, symbol, start, end, timeout
+    )
+
+
+def _download_history(symbol: str, start: date, end: date, timeout: float) -> pd.Series | None:
+    provider = get_provider()
+    endpoint = f"{provider.name}_history"
+    circuit = breaker(endpoint)
+    circuit.check()
+    upstream(endpoint)
+    try:
+        with span("upstream", endpoint=endpoint):
+            history = provider.history(
+                symbol,
+                start=start,
+                # the end date is exclusive upstream, so include an extra day
+                end=end + timedelta(days=1),
+                auto_adjust=False,
+                timeout=timeout,
+            )
+    except Exception:
+        circuit.failure()
+        return None
+    circuit.success()
+    response_size(endpoint, _frame_bytes(history))
+    if history is None:
+        return None
+    for field in ("Adj Close", "Close"):
+        frame = _close_frame(history, [symbol], field)
+        if symbol in frame.columns and not frame[symbol].dropna().empty:
+            series = frame[symbol].dropna()
+            # Ticker.history stamps bars in the exchange's timezone; the store keeps
+            # naive dates, and mixing the two in one index breaks the merge
+            if getattr(series.index, "tz", None) is not None:
+                series.index = series.index.tz_localize(None)
+            return series
+    return pd.Series(dtype=float)
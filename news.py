@@ -0,0 +1,153 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from instrumentation import cache_result, response_size, span, timed, upstream
+from news_store import NEWS, NewsStore
+from resilience import Backoff, breaker
+from services import requests
+
+FINNHUB_NEWS_URL = "https://finnhub.io/api/v1/company-news"
+# finnhub's free tier allows 60 calls a minute per key
+CALLS_PER_MINUTE = 60
+NEWS_WORKERS = 8
+# how long a ticker's stored news counts as fresh before asking finnhub again
+NEWS_TTL = 3600
+NEWS_WINDOW_DAYS = 7
+ARTICLES_PER_TICKER = 5
+NEWS_ENDPOINT = "finnhub_company_news"
+# tickers whose fetch failed serve stored articles and back off
+NEWS_BACKOFF = Backoff("news")
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a call is allowed."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self._tokens = float(per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float = 60.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class NewsClient:
+    """Finnhub company-news client shared by every session: one pooled
+    requests.Session, a worker pool, a per-key rate limit and the on-disk
+    article store."""
+
+    def __init__(
+        self,
+        api_key: str,
+        calls_per_minute: int = CALLS_PER_MINUTE,
+        max_workers: int = NEWS_WORKERS,
+        store: NewsStore = NEWS,
+    ):
+        self.api_key = api_key
+        self.bucket = TokenBucket(calls_per_minute)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="news")
+        self.store = store
+
+    def _fresh(self, ticker: str) -> bool:
+        last = self.store.last_fetch(ticker)
+        return last is not None and time.time() - last[0] < NEWS_TTL
+
+    def _stored(self, ticker: str) -> list:
+        since = date.today() - timedelta(days=NEWS_WINDOW_DAYS)
+        since_ts = int(time.mktime(since.timetuple()))
+        return self.store.recent(ticker, since_ts, ARTICLES_PER_TICKER)
+
+    @timed("fetch_news")
+    def company_news(self, ticker: str) -> list:
+        """Recent company news (last 7 days), asking Finnhub only for days not yet stored."""
+        if self._fresh(ticker):
+            cache_result("news", hits=1)
+            return self._stored(ticker)
+        cache_result("news", misses=1)
+        circuit = breaker(NEWS_ENDPOINT)
+        # check before taking a rate-limit token that would go unused
+        if NEWS_BACKOFF.blocked(ticker) or circuit.is_open and not circuit.allow():
+            return self._stored(ticker)
+        if not self.bucket.acquire():
+            return self._stored(ticker)
+        to_date = date.today()
+        window_start = from_date = to_date - timedelta(days=NEWS_WINDOW_DAYS)
+        last = self.store.last_fetch(ticker)
+        if last is not None:
+            # finnhub filters by whole days, so re-ask for the last fetched day
+            from_date = max(from_date, last[1])
+        upstream(NEWS_ENDPOINT)
+        try:
+            with span("upstream", endpoint=NEWS_ENDPOINT):
+                r = self.session.get(
+                    FINNHUB_NEWS_URL,
+                    params={
+                        "symbol": ticker,
+                        "from": from_date.isoformat(),
+                        "to": to_date.isoformat(),
+                        "token": self.api_key,
+                    },
+                    timeout=10,
+                )
+        except requests.RequestException:
+            circuit.failure()
+            NEWS_BACKOFF.failure(ticker)
+            return self._stored(ticker)
+        response_size(NEWS_ENDPOINT, len(r.content))
+        if r.status_code != 200:
+            circuit.failure()
+            NEWS_BACKOFF.failure(ticker)
+            return self._stored(ticker)
+        circuit.success()
+        NEWS_BACKOFF.success(ticker)
+        # anything older than the window is never shown again
+        self.store.add(ticker, r.json(), to_date, keep_since=window_start)
+        return self._stored(ticker)
+
+    def stream(self, tickers):
+        """Yield (ticker, articles) as each fetch finishes, stored tickers first."""
+        pending = {}
+        for ticker in dict.fromkeys(tickers):
+            if self._fresh(ticker):
+                cache_result("news", hits=1)
+                yield ticker, self._stored(ticker)
+            else:
+                pending[self.pool.submit(self.company_news, ticker)] = ticker
+        for future in as_completed(pending):
+            try:
+                yield pending[future], future.result()
+            except Exception:
+                yield pending[future], []
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_news_client(api_key: str) -> NewsClient:
+    """One client per API key for the whole process, so the rate limit is shared."""
+    with _clients_lock:
+        if api_key not in _clients:
+            _clients[api_key] = NewsClient(api_key)
+        return _clients[api_key]
@@ -0,0 +1,128 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+NEWS_DB_PATH = Path(__file__).resolve().parent / "data" / "news.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id       TEXT PRIMARY KEY,
+    datetime INTEGER NOT NULL,
+    payload  TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ticker_articles (
+    ticker     TEXT NOT NULL,
+    article_id TEXT NOT NULL REFERENCES articles(id),
+    datetime   INTEGER NOT NULL,
+    PRIMARY KEY (ticker, article_id)
+);
+CREATE INDEX IF NOT EXISTS ticker_articles_recent ON ticker_articles (ticker, datetime DESC);
+-- for pruning: old articles, and whether any ticker still points at one
+CREATE INDEX IF NOT EXISTS articles_datetime ON articles (datetime);
+CREATE INDEX IF NOT EXISTS ticker_articles_article ON ticker_articles (article_id);
+CREATE TABLE IF NOT EXISTS ticker_fetches (
+    ticker     TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL,
+    last_to    TEXT NOT NULL
+);
+"""
+
+
+def article_id(article: dict) -> str:
+    # finnhub ids are per-ticker for syndicated stories, the url isn't
+    return article.get("url") or str(article.get("id"))
+
+
+class NewsStore:
+    """Persistent, deduplicated article store with a per-ticker index.
+
+    Each article is stored once no matter how many tickers it was returned
+    for; ``ticker_fetches`` remembers how far each ticker has been fetched so
+    refreshes only ask Finnhub for the days since. Each fetch prunes what has
+    aged out of the window, so the file stays the size of the window.
+    """
+
+    def __init__(self, path: Path = NEWS_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def last_fetch(self, ticker: str) -> tuple[float, date] | None:
+        row = self._connect().execute(
+            "SELECT fetched_at, last_to FROM ticker_fetches WHERE ticker = ?", (ticker,)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], date.fromisoformat(row[1])
+
+    def add(
+        self, ticker: str, articles: list, fetched_to: date, keep_since: date | None = None
+    ) -> int:
+        """Store a fetch result for ``ticker``; returns how many articles were new.
+
+        With ``keep_since``, the ticker's articles from before that day are dropped
+        in the same transaction, along with articles no ticker refers to any more.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO articles (id, datetime, payload) VALUES (?, ?, ?)",
+                [
+                    (article_id(a), int(a.get("datetime") or 0), json.dumps(a))
+                    for a in articles
+                ],
+            )
+            new = conn.total_changes - before
+            conn.executemany(
+                "INSERT OR IGNORE INTO ticker_articles (ticker, article_id, datetime) "
+                "VALUES (?, ?, ?)",
+                [(ticker, article_id(a), int(a.get("datetime") or 0)) for a in articles],
+            )
+            if keep_since is not None:
+                cutoff = int(time.mktime(keep_since.timetuple()))
+                conn.execute(
+                    "DELETE FROM ticker_articles WHERE ticker = ? AND datetime < ?", (ticker, cutoff)
+                )
+                conn.execute(
+                    "DELETE FROM articles WHERE datetime < ? AND NOT EXISTS "
+                    "(SELECT 1 FROM ticker_articles t WHERE t.article_id = articles.id)",
+                    (cutoff,),
+                )
+            conn.execute(
+                "INSERT INTO ticker_fetches (ticker, fetched_at, last_to) VALUES (?, ?, ?) "
+                "ON CONFLICT(ticker) DO UPDATE SET "
+                "fetched_at = excluded.fetched_at, last_to = excluded.last_to",
+                (ticker, time.time(), fetched_to.isoformat()),
+            )
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return new
+
+    def recent(self, ticker: str, since_ts: int, limit: int) -> list:
+        rows = self._connect().execute(
+            "SELECT a.payload FROM ticker_articles t JOIN articles a ON a.id = t.article_id "
+            "WHERE t.ticker = ? AND t.datetime >= ? ORDER BY t.datetime DESC LIMIT ?",
+            (ticker, since_ts, limit),
+        ).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+
+# shared by every session in the server process
+NEWS = NewsStore()
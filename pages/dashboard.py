@@ -1,18 +1,29 @@
 import streamlit as st
 import json
 from pathlib import Path
-import pandas as pd
-import requests
-import yfinance as yf
 from datetime import date, timedelta, datetime
-import altair as alt
-from storage import load_users, save_users
-
-st.set_page_config(page_title="Dashboard - Cportfolio", page_icon="", layout="wide")
-
-# load in user data
-#data_path = Path(__file__).parent.parent / "data" / "users.json"
-USERS = load_users()
+from storage import add_shares, get_portfolio, remove_position, sell_shares
+from market_data import get_quotes
+from quote_cache import market_is_open
+from quote_refresher import REFRESHER
+from analytics import HOLDINGS_COLUMNS, holdings_table
+from news import NEWS_ENDPOINT, get_news_client
+from debug_panel import render_debug_panel
+from services import alt, pd
+from symbols import SYMBOLS, looks_like_symbol, normalize
+from resilience import open_endpoints
+from import_panel import render_import_panel
+
+st.set_page_config(page_title="Dashboard - Cportfolio", layout="wide")
+
+# above this many positions the holdings table is filtered, sorted and paged server-side
+LARGE_PORTFOLIO_ROWS = 200
+PAGE_SIZES = [50, 100, 250]
+CHART_MAX_BARS = 50
+# how often (seconds) the holdings section re-reads the warm quote cache
+LIVE_REFRESH_SECONDS = 30
+# headlines are only loaded for this many of the largest positions
+NEWS_MAX_TICKERS = 20
 
 # check login status
 if "user" not in st.session_state or st.session_state.user is None:
@@ -21,7 +32,7 @@ if "user" not in st.session_state or st.session_state.user is None:
 
 #load user portfolio
 user = st.session_state.user
-portfolio = USERS[user]["portfolio"]
+portfolio = get_portfolio(user)
 tickers = list(portfolio.keys())
 
 stocks = list(portfolio.items())
@@ -31,6 +42,7 @@ st.sidebar.success(f"Logged in as {user}")
 if st.sidebar.button("Log out", use_container_width=True):
     st.session_state.user = None
     st.switch_page("home.py")
+render_debug_panel(user)
 
 st.title(f"{user.capitalize()}'s Portfolio Dashboard ")
 
@@ -48,211 +60,202 @@ def style_pnl(value):
 # might be an issue here w loading in data for empty portfolio user. either gotta open account w min. 1 stock or adjust this page
 
 st.subheader("Your Portfolio")
-@st.cache_data
 def fetch_prices(ticker_list):
-    tickers = (
-        [ticker_list]
-        if isinstance(ticker_list, str)
-        else list(ticker_list or [])
-    )
-    prices = {}
-    for ticker in tickers:
-        try:
-            data = yf.download(
-                ticker,
-                period="2d",
-                interval="1d",
-                progress=False,
-                group_by="ticker",
-            )
-        except Exception:
-            continue
-        if data is None or getattr(data, "empty", True):
-            continue
-        try:
-            closes = data["Close"].dropna()
-        except KeyError:
-            # yfinance sometimes nests with MultiIndex
-            if isinstance(data.columns, pd.MultiIndex):
-                try:
-                    closes = data.xs("Close", level=-1, axis=1).iloc[:, 0].dropna()
-                except Exception:
-                    continue
-            else:
-                continue
-        if closes.empty:
-            continue
-        current = float(closes.iloc[-1])
-        prev = float(closes.iloc[-2]) if len(closes) > 1 else float("nan")
-        prices[ticker] = {"price": current, "prev_close": prev}
-    return prices
-
-price_map = fetch_prices(tickers)
-
-rows = []
-for ticker, shares in portfolio.items():
-    price_info = price_map.get(ticker, {})
-    price = price_info.get("price")
-    prev_close = price_info.get("prev_close")
-    value = shares * price if price is not None else None
-    daily_pnl = (
-        shares * (price - prev_close)
-        if price is not None
-        and prev_close is not None
-        and not pd.isna(prev_close)
-    else None
-    )
-    rows.append(
-        {
-            "Ticker": ticker,
-            "Shares": shares,
-            "Price": price,
-            "Value": value,
-            "Daily PnL": daily_pnl,
-        }
-    )
+    # per-symbol cache shared across sessions, misses go out as one batched download
+    return get_quotes(ticker_list)
 
-df = pd.DataFrame(rows)
 
-if df.empty:
-    st.info("Your portfolio is empty. Add positions to view analytics.")
-    # add new stock form
+def unknown_symbol_message(symbol):
+    suggestions = SYMBOLS.suggest(symbol)
+    hint = f" Did you mean {' or '.join(suggestions)}?" if suggestions else ""
+    return f"{symbol} isn't a listed symbol.{hint}"
+
+
+def symbol_option(symbol):
+    if SYMBOLS.is_known(symbol):
+        return SYMBOLS.label(symbol)
+    return f"{symbol} · not in the symbol list, checked when added"
+
+
+# typing a search only reruns the form, not the holdings and news around it
+@st.fragment
+def add_stock_form():
     st.markdown("### Add a New Stock")
 
-    with st.form("add_stock_form"):
-        new_ticker = st.text_input("Stock Symbol (e.g., AAPL, MSFT, TSLA)").upper().strip()
-        new_shares = st.number_input("Number of Shares", min_value=1, step=1)
-        submitted = st.form_submit_button("Add Stock", use_container_width=True)
+    query = st.text_input(
+        "Stock Symbol",
+        placeholder="Search by symbol or company, e.g. AAPL, Tesla, BTC",
+        key="add_stock_query",
+    )
+    new_ticker = None
+    if query.strip():
+        symbol = normalize(query)
+        # prefix search over the local symbol master
+        matches = SYMBOLS.search(query)
+        if SYMBOLS.is_known(symbol):
+            matches = [symbol] + [m for m in matches if m != symbol]
+        else:
+            matches = list(dict.fromkeys(SYMBOLS.suggest(symbol) + matches))
+            # company names and half-typed symbols land here too; only complain
+            # when nothing in the symbol list matches
+            if not matches:
+                st.error(unknown_symbol_message(symbol))
+            if looks_like_symbol(symbol):
+                # the symbol list isn't exhaustive; a real listing is confirmed on add
+                matches.append(symbol)
+        if matches:
+            new_ticker = st.selectbox(
+                "Matches", matches, format_func=symbol_option, key="add_stock_pick"
+            )
+    new_shares = st.number_input("Number of Shares", min_value=1, step=1)
+    trade_date = st.date_input("Trade Date", value=date.today(), max_value=date.today())
+    submitted = st.button("Add Stock", use_container_width=True, disabled=new_ticker is None)
 
     if submitted:
-        if not new_ticker:
-            st.error("Please enter a valid stock symbol.")
-        else:
-            # if the stock already exists, add shares
-            if new_ticker in portfolio:
-                portfolio[new_ticker] += int(new_shares)
-                st.success(f"Added {new_shares} more shares of {new_ticker}.")
-            else:
-                portfolio[new_ticker] = int(new_shares)
-                st.success(f"Added {new_ticker} with {new_shares} shares to your portfolio.")
-
-            # save info back to users.json
-            USERS[user]["portfolio"] = portfolio
-            save_users(USERS)
-
-            # force UI refresh
-            st.rerun()
-    st.stop()
+        # never store a symbol every later rerun would fail to fetch
+        if not SYMBOLS.is_known(new_ticker) and new_ticker not in fetch_prices([new_ticker]):
+            st.error(f"No market data found for {new_ticker}, so it wasn't added.")
+            return
 
-df["Portfolio %"] = float("nan")
-if df["Value"].notna().any():
-    total_value = df["Value"].sum()
-    if total_value:
-        df["Portfolio %"] = df["Value"] / total_value * 100
-
-numeric_cols = ["Price", "Value", "Daily PnL", "Portfolio %"]
-
-for col in numeric_cols:
-    if col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
-
-total_value = df["Value"].sum(skipna=True) if "Value" in df else 0.0
-daily_pnl_total = df["Daily PnL"].sum(skipna=True) if "Daily PnL" in df else 0.0
-metrics_col1, metrics_col2 = st.columns(2)
-with metrics_col1:
-    st.metric("Total Portfolio Value", f"${total_value:,.2f}")
-with metrics_col2:
-    color_style = style_pnl(daily_pnl_total)  
-    # html here to colour code the daily pnl since only deltas can be colour-coded with streamlit
-    st.markdown(
-        f"""
-        <div style="display:flex;flex-direction:column;">
-            <span style="font-size:0.9rem;opacity:0.7;">Daily PnL</span>
-            <span style="font-size:2rem;font-weight:700;{color_style}">${daily_pnl_total:,.2f}</span>
-        </div>
-        """,
-        unsafe_allow_html=True,
-    )  
-    
+        # if the stock already exists, add shares
+        if new_ticker in portfolio:
+            st.success(f"Added {new_shares} more shares of {new_ticker}.")
+        else:
+            st.success(f"Added {new_ticker} with {new_shares} shares to your portfolio.")
 
+        # journaled buy, concurrent sessions can't overwrite each other
+        add_shares(user, new_ticker, int(new_shares), trade_date)
 
-def format_currency(x):
-    return "—" if pd.isnull(x) else f"${x:,.2f}"
+        # force UI refresh
+        st.rerun()
 
 
-def format_percent(x):
-    return "—" if pd.isnull(x) else f"{x:.1f}%"
+if not portfolio:
+    st.info("Your portfolio is empty. Add positions to view analytics.")
+    add_stock_form()
+    render_import_panel(user)
+    st.stop()
 
 
-def format_shares(x):
-    return "—" if pd.isnull(x) else f"{x:,.0f}"
+HOLDINGS_COLUMN_CONFIG = {
+    "Ticker": st.column_config.TextColumn("Ticker"),
+    "Shares": st.column_config.NumberColumn("Shares", format="localized"),
+    "Price": st.column_config.NumberColumn("Price", format="dollar"),
+    "Value": st.column_config.NumberColumn("Value", format="dollar"),
+    # accounting format puts losses in parentheses, no per-cell styling needed
+    "Daily PnL": st.column_config.NumberColumn("Daily PnL", format="accounting"),
+    "Portfolio %": st.column_config.NumberColumn("Portfolio %", format="%.1f%%"),
+}
 
 
-styled_df = (
-    df.style.format(
-        {
-            "Shares": format_shares,
-            "Price": format_currency,
-            "Value": format_currency,
-            "Portfolio %": format_percent,
-            "Daily PnL": format_currency,
-        }
-    )
-    .applymap(style_pnl, subset=["Daily PnL"])
-    .hide(axis="index")
-)
-
-st.dataframe(styled_df, use_container_width=True)
-
-chart_df = df.dropna(subset=["Value"])
-if not chart_df.empty:
-    bar_chart = (
-        alt.Chart(chart_df)
-        .mark_bar()
-        .encode(
-            x=alt.X("Ticker:N", title="Ticker"),
-            y=alt.Y("Value:Q", title="Value", axis=alt.Axis(format="$,.0f")),
-            tooltip=[
-                alt.Tooltip(field="Ticker", type="nominal"),
-                alt.Tooltip(field="Value", type="quantitative", format="$,.2f", title="Value"),
-                alt.Tooltip(field="Price", type="quantitative", format="$,.2f", title="Price"),
-                alt.Tooltip(field="Portfolio %", type="quantitative", format=".1f", title="Portfolio %"),
-                alt.Tooltip(field="Daily PnL", type="quantitative", format="$,.2f", title="Daily PnL"),
-            ],
-        )
-        .properties(height=320)
+def render_holdings(table):
+    st.dataframe(
+        table,
+        column_config=HOLDINGS_COLUMN_CONFIG,
+        hide_index=True,
+        use_container_width=True,
     )
-    st.altair_chart(bar_chart, use_container_width=True)
-else:
-    st.info("No price data available to chart.")
 
 
-# add new stock form
-st.markdown("### Add a New Stock")
+# only the holdings section reruns on the timer, and only while prices move;
+# the forms and news below stay put
+@st.fragment(run_every=LIVE_REFRESH_SECONDS if REFRESHER.enabled and market_is_open() else None)
+def live_holdings():
+    # keeps this user's tickers warm in the background so the reruns read the cache
+    REFRESHER.touch(user)
+    # re-read so trades from the user's other sessions show up too
+    portfolio = get_portfolio(user)
+    # held symbols are priced whether or not the symbol list knows them
+    price_map = fetch_prices(list(portfolio))
+    df = holdings_table(portfolio, price_map)
+
+    # failing symbols and endpoints back off instead of stalling the page, say so
+    unpriced = [t for t in portfolio if t not in price_map]
+    if unpriced or open_endpoints():
+        detail = f"No current price for {', '.join(unpriced[:10])}. " if unpriced else ""
+        st.badge(
+            "Data temporarily unavailable",
+            icon=":material/cloud_off:",
+            color="orange",
+            help=detail + "Showing what's cached; retrying in the background.",
+        )
 
-with st.form("add_stock_form"):
-    new_ticker = st.text_input("Stock Symbol (e.g., AAPL, MSFT, TSLA)").upper().strip()
-    new_shares = st.number_input("Number of Shares", min_value=1, step=1)
-    submitted = st.form_submit_button("Add Stock", use_container_width=True)
+    total_value = df["Value"].sum(skipna=True) if "Value" in df else 0.0
+    daily_pnl_total = df["Daily PnL"].sum(skipna=True) if "Daily PnL" in df else 0.0
+    metrics_col1, metrics_col2 = st.columns(2)
+    with metrics_col1:
+        st.metric("Total Portfolio Value", f"${total_value:,.2f}")
+    with metrics_col2:
+        color_style = style_pnl(daily_pnl_total)
+        # html here to colour code the daily pnl since only deltas can be colour-coded with streamlit
+        st.markdown(
+            f"""
+            <div style="display:flex;flex-direction:column;">
+                <span style="font-size:0.9rem;opacity:0.7;">Daily PnL</span>
+                <span style="font-size:2rem;font-weight:700;{color_style}">${daily_pnl_total:,.2f}</span>
+            </div>
+            """,
+            unsafe_allow_html=True,
+        )
 
-if submitted:
-    if not new_ticker:
-        st.error("Please enter a valid stock symbol.")
+    if len(df) <= LARGE_PORTFOLIO_ROWS:
+        render_holdings(df)
     else:
-        # if the stock already exists, add shares
-        if new_ticker in portfolio:
-            portfolio[new_ticker] += int(new_shares)
-            st.success(f"Added {new_shares} more shares of {new_ticker}.")
-        else:
-            portfolio[new_ticker] = int(new_shares)
-            st.success(f"Added {new_ticker} with {new_shares} shares to your portfolio.")
+        # large books: filter, sort and page on the server so only one page goes to the browser
+        filter_col, sort_col, order_col, size_col = st.columns([3, 2, 1, 1])
+        with filter_col:
+            query = st.text_input("Filter tickers", key="holdings_filter").upper().strip()
+        with sort_col:
+            sort_by = st.selectbox("Sort by", HOLDINGS_COLUMNS, index=HOLDINGS_COLUMNS.index("Value"))
+        with order_col:
+            descending = st.toggle("Descending", value=True)
+        with size_col:
+            page_size = st.selectbox("Rows per page", PAGE_SIZES)
+
+        view = df
+        if query:
+            view = view[view["Ticker"].str.contains(query, regex=False)]
+        view = view.sort_values(sort_by, ascending=not descending, na_position="last")
+
+        pages = max(1, -(-len(view) // page_size))
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1)
+        render_holdings(view.iloc[(page - 1) * page_size : page * page_size])
+        st.caption(f"{len(view):,} of {len(df):,} positions · page {page} of {pages}")
+
+    chart_df = df.dropna(subset=["Value"])
+    if len(chart_df) > CHART_MAX_BARS:
+        # thousands of bars are unreadable; chart the largest positions only
+        chart_df = chart_df.nlargest(CHART_MAX_BARS, "Value")
+        st.caption(f"Showing the {CHART_MAX_BARS} largest positions.")
+    if not chart_df.empty:
+        bar_chart = (
+            alt.Chart(chart_df)
+            .mark_bar()
+            .encode(
+                x=alt.X("Ticker:N", title="Ticker"),
+                y=alt.Y("Value:Q", title="Value", axis=alt.Axis(format="$,.0f")),
+                tooltip=[
+                    alt.Tooltip(field="Ticker", type="nominal"),
+                    alt.Tooltip(field="Value", type="quantitative", format="$,.2f", title="Value"),
+                    alt.Tooltip(field="Price", type="quantitative", format="$,.2f", title="Price"),
+                    alt.Tooltip(field="Portfolio %", type="quantitative", format=".1f", title="Portfolio %"),
+                    alt.Tooltip(field="Daily PnL", type="quantitative", format="$,.2f", title="Daily PnL"),
+                ],
+            )
+            .properties(height=320)
+        )
+        st.altair_chart(bar_chart, use_container_width=True)
+    else:
+        st.info("No price data available to chart.")
+    st.caption(f"Prices as of {datetime.now():%H:%M:%S}")
 
-        # save info back to users.json
-        USERS[user]["portfolio"] = portfolio
-        save_users(USERS)
 
-        # force UI refresh
-        st.rerun()
+live_holdings()
+
+
+# add new stock form
+add_stock_form()
+render_import_panel(user)
 
 
 # update/ remove a stock
@@ -271,17 +274,29 @@ st.write("Current Selection:", option)
 print(stocks) # debugging line to be removed later
 
 if option is not None:
+    selected_ticker = option.split(" ")[0]
+    sell_col, date_col = st.columns(2)
+    with sell_col:
+        sell_qty = st.number_input("Shares to Sell", min_value=1, step=1)
+    with date_col:
+        sell_date = st.date_input(
+            "Trade Date", value=date.today(), max_value=date.today(), key="sell_date"
+        )
+
+    if st.button("Sell Shares", use_container_width=True):
+        if sell_shares(user, selected_ticker, int(sell_qty), sell_date):
+            st.rerun()
+        else:
+            st.error("Error ticker not found")
+
     if st.button("Remove Stock", use_container_width=True):
        
-        ticker_to_remove = option.split(" ")[0]
+        ticker_to_remove = selected_ticker
 
         if ticker_to_remove in portfolio:
            
-            del portfolio[ticker_to_remove]
-            #write back into USERS
-            USERS[user]["portfolio"] = portfolio
-            #save to users.json
-            save_users(USERS)
+            # journal the removal so the backtest still sees the earlier position
+            remove_position(user, ticker_to_remove, sell_date)
             #refresh UI
             st.rerun()
         else:
@@ -294,46 +309,58 @@ if option is not None:
 FINNHUB_API_KEY = st.secrets.get("FINNHUB_API_KEY")
 
 if FINNHUB_API_KEY:
-
-    @st.cache_data(ttl=3600)
-    def get_stock_news(ticker):
-        """Fetch recent company news from Finnhub (last 7 days)."""
-        to_date = date.today()
-        from_date = to_date - timedelta(days=7)
-        url = (
-            f"https://finnhub.io/api/v1/company-news"
-            f"?symbol={ticker}&from={from_date}&to={to_date}&token={FINNHUB_API_KEY}"
-        )
-        try:
-            r = requests.get(url, timeout=10)
-        except requests.RequestException:
-            return []
-        if r.status_code == 200:
-            return r.json()[:5]
-        return []
+    news_client = get_news_client(FINNHUB_API_KEY)
+
+    def render_articles(articles):
+        if not articles:
+            st.info("No recent news found.")
+            return
+
+        for a in articles:
+            headline = a.get("headline", "No headline")
+            url = a.get("url", "#")
+            source = a.get("source", "Unknown")
+            dt_str = "Unknown Date"
+            try:
+                dt = datetime.fromtimestamp(a["datetime"])
+                dt_str = dt.strftime("%Y-%m-%d %H:%M")
+            except Exception:
+                pass
+
+            st.markdown(f"**[{headline}]({url})**  \n*{source} — {dt_str}*")
     
     st.subheader(" Latest News for Your Stocks")
 
-    for ticker in tickers:
+    news_tickers = tickers
+    if len(tickers) > NEWS_MAX_TICKERS:
+        # one expander and fetch per ticker doesn't scale to big books; the
+        # quotes are already warm from the holdings section
+        quotes = fetch_prices(tickers)
+
+        def position_value(ticker):
+            price = (quotes.get(ticker) or {}).get("price")
+            return portfolio[ticker] * price if price else 0.0
+
+        news_tickers = sorted(tickers, key=position_value, reverse=True)[:NEWS_MAX_TICKERS]
+        st.caption(f"Headlines for your {NEWS_MAX_TICKERS} largest positions.")
+
+    # lay out every expander first, then fill each one as its fetch comes back
+    slots = {}
+    for ticker in news_tickers:
         with st.expander(f"{ticker} - Recent Headlines"):
-            articles = get_stock_news(ticker)
-
-            if not articles:
-                st.info("No recent news found.")
-                continue
-
-            for a in articles:
-                headline = a.get("headline", "No headline")
-                url = a.get("url", "#")
-                source = a.get("source", "Unknown")
-                dt_str = "Unknown Date"
-                try:
-                    dt = datetime.fromtimestamp(a["datetime"])
-                    dt_str = dt.strftime("%Y-%m-%d %H:%M")
-                except Exception:
-                    pass
-
-                st.markdown(f"**[{headline}]({url})**  \n*{source} — {dt_str}*")
+            slots[ticker] = st.empty()
+            slots[ticker].caption("Loading headlines...")
+
+    for ticker, articles in news_client.stream(news_tickers):
+        with slots[ticker].container():
+            render_articles(articles)
+    if NEWS_ENDPOINT in open_endpoints():
+        st.badge(
+            "News temporarily unavailable",
+            icon=":material/cloud_off:",
+            color="orange",
+            help="Showing stored headlines; retrying shortly.",
+        )
 else:
     st.subheader("Latest News for Your Stocks")
     st.info("Add `FINNHUB_API_KEY` to `.streamlit/secrets.toml` to enable stock news.")
@@ -2,19 +2,15 @@ import streamlit as st
 import json
 from pathlib import Path
 from datetime import date, timedelta, datetime
-import requests
-import pandas as pd
 import os
-from storage import load_users, save_users
+from storage import get_portfolio
 
 #pip install huggingface-hub
-from huggingface_hub import InferenceClient
+from insights import INSIGHT_JOBS, submit_insights
+from debug_panel import render_debug_panel
+from services import pd
 
-st.set_page_config(page_title="Insights - Cportfolio", page_icon="", layout="wide")
-
-# load in user data
-
-USERS = load_users()
+st.set_page_config(page_title="Insights - Cportfolio", layout="wide")
 
 # check login status
 if "user" not in st.session_state or st.session_state.user is None:
@@ -22,7 +18,7 @@ if "user" not in st.session_state or st.session_state.user is None:
     st.switch_page("home.py")
      
 user = st.session_state.user
-portfolio = USERS[user]["portfolio"]
+portfolio = get_portfolio(user)
 tickers = list(portfolio.keys())
 
 st.sidebar.success(f"Logged in as {user}")
@@ -32,6 +28,7 @@ st.sidebar.success(f"Logged in as {user}")
 if st.sidebar.button("Log out", use_container_width=True):
     st.session_state.user = None
     st.switch_page("home.py")
+render_debug_panel(user)
 
 # main page
 
@@ -40,6 +37,10 @@ st.divider()
 
 st.subheader("Your current holdings")
 
+if not portfolio:
+    st.info("No holdings found for your account. Add positions on the dashboard to begin.")
+    st.stop()
+
 df = pd.DataFrame(
     [{"Ticker": t, "Shares Owned": portfolio[t]} for t in tickers]
 ).sort_values("Ticker")
@@ -49,16 +50,10 @@ st.dataframe(df, use_container_width=True)
 
 st.subheader("Artificial Intelligence Insights")
 
-# Initialize the InferenceClient with your Hugging Face API token
-
-client = InferenceClient(
-    api_key=st.secrets.get("HF_TOKEN")
-)
-
 # ---------- Build JSON payload ----------
+# holdings only: answers are cached by holdings and shared across users, so
+# nothing user-specific may reach the prompt
 payload = {
-    "user": user,
-    "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
     "holdings": [
         {"ticker": t, "shares": int(portfolio[t])}
         for t in tickers
@@ -68,63 +63,42 @@ payload = {
 #debug code to see what json looks like when being sent.
 #st.code(json.dumps(payload, indent=2), language="json")
 
-def call_hf_insights(payload: dict) -> str:
-    hf_token = st.secrets.get("HF_TOKEN")
-    if not hf_token:
-        #error checking for missing token
-        return "No HF_TOKEN found in .streamlit/secrets.toml"
-    
-    #create the client with the key
-    client = InferenceClient(api_key=hf_token)
-
-    #make the prompt , this prompt was designed for this use case. 
-    prompt = f"""
-You are a calm, neutral portfolio analyst.
-
-Given the following JSON describing a user's stock holdings, do NOT give financial advice.
-Instead, do this:
-
-1. Give 3–6 bullet-point **insights** about:
-   - concentration vs diversification
-   - any unusually large positions
-   - anything interesting about the mix of tickers (e.g. large cap vs others, tech-heavy, etc.)
-
-2. Give 2–3 **popular narratives** or themes that investors often talk about
-   for portfolios like this (e.g. “big tech growth focus”, “EV-heavy exposure”, etc.).
-   Keep them generic, not as recommendations.
-
-3. Give 2–3 **risks to watch**, phrased cautiously.
-
-Important rules:
-- DO NOT tell the user what they *should* buy or sell.
-- DO NOT mention that you are an AI; just speak like an analyst.
-- Use markdown with headings and bullet points.
-- Be concise.
-
-JSON:
-{json.dumps(payload, indent=2)}
-"""
-    #call the model
-    completion = client.chat.completions.create(
-        model ="HuggingFaceH4/zephyr-7b-beta:featherless-ai", 
-        messages=[
-            {
-                "role": "user",
-                "content": prompt,
-            }
-        ],
-        max_tokens=250,
-    )
-
-    msg = completion.choices[0].message
-    if isinstance(msg, dict):
-        return msg.get("content", "").strip()
-    return getattr(msg, "content", str(msg)).strip()
-
 st.markdown("AI-Generated Portfolio Insight")
 
 if st.button("Generate Insights", use_container_width=True):
-    with st.spinner("Generating insights..."):
-        insights = call_hf_insights(payload)
-        
-    st.markdown(insights)
\ No newline at end of file
+    hf_token = st.secrets.get("HF_TOKEN")
+    if not hf_token:
+        #error checking for missing token
+        st.markdown("No HF_TOKEN found in .streamlit/secrets.toml")
+    else:
+        # runs on the background pool, so widget reruns don't kill the request
+        st.session_state.insight_job = submit_insights(payload, hf_token)
+
+
+def render_job(job):
+    if job.state == "failed":
+        st.error(f"Could not generate insights: {job.error}")
+    elif job.state == "done":
+        st.markdown(job.result)
+    elif job.partial:
+        st.markdown(job.partial)
+    else:
+        st.info("Generating insights...")
+
+
+@st.fragment(run_every=1)
+def poll_job(job_id):
+    job = INSIGHT_JOBS.get(job_id)
+    if job is None or job.finished:
+        # full rerun renders the final answer and stops the polling
+        st.rerun()
+    render_job(job)
+
+
+job_id = st.session_state.get("insight_job")
+job = INSIGHT_JOBS.get(job_id) if job_id else None
+if job is not None:
+    if job.finished:
+        render_job(job)
+    else:
+        poll_job(job_id)
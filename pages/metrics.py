@@ -1,17 +1,20 @@
+from __future__ import annotations
+
+import hashlib
 import json
 from datetime import date, timedelta
 from pathlib import Path
 
-import altair as alt
-import numpy as np
-import pandas as pd
 import streamlit as st
-import yfinance as yf
-from storage import load_users, save_users
-
-st.set_page_config(page_title="Cportfolio - Metrics", page_icon="", layout="wide")
+from storage import get_portfolio, load_journal
+from analytics import BENCHMARKS, RATIO_METRICS, journal_backtest, too_new_to_backtest
+from history_store import load_history_frame
+from charts import HALF_CHART_WIDTH, downsample_long
+from debug_panel import render_debug_panel
+from services import alt, pd
+from symbols import SYMBOLS
 
-USERS = load_users()
+st.set_page_config(page_title="Cportfolio - Metrics", layout="wide")
 
 # ensure login to access portfolio metrics
 if "user" not in st.session_state or st.session_state.user is None:
@@ -19,7 +22,7 @@ if "user" not in st.session_state or st.session_state.user is None:
     st.switch_page("home.py")
 
 user = st.session_state.user
-portfolio = USERS.get(user, {}).get("portfolio", {})
+portfolio = get_portfolio(user)
 
 st.title("Portfolio Metrics")
 st.caption("Run historical performance analytics on your holdings.")
@@ -31,49 +34,58 @@ if not portfolio:
     st.stop()
 
 
-@st.cache_data
-def fetch_history(tickers: tuple[str, ...], start: date, end: date) -> pd.DataFrame:
-    """Download adjusted close prices for the provided tickers."""
+class PartialHistory(Exception):
+    """Raised out of cached_backtest so st.cache_data doesn't memoize a result
+    missing tickers that only hit the deadline; it carries the result instead."""
+
+    def __init__(self, outcome):
+        super().__init__("price history still loading")
+        self.outcome = outcome
+
+
+def fetch_history(
+    tickers: tuple[str, ...], start: date, end: date, timed_out: list | None = None
+) -> tuple[pd.DataFrame, list[str]]:
+    """Adjusted close prices for the provided tickers, loaded concurrently from the history store."""
     if not tickers:
-        return pd.DataFrame()
-
-    frames = []
-    labels = []
-    # yfinance treats the end date as exclusive, so include an extra day
-    end_plus_one = end + timedelta(days=1)
-
-    for ticker in tickers:
-        try:
-            history = yf.download(
-                ticker,
-                start=start,
-                end=end_plus_one,
-                progress=False,
-            )
-        except Exception:
-            continue
-        if history is None or history.empty:
-            continue
-        series = history.get("Adj Close")
-        if series is None or series.dropna().empty:
-            series = history.get("Close")
-        if series is None or series.dropna().empty:
-            continue
-        frames.append(series.dropna())
-        labels.append(ticker)
-
-    if not frames:
-        return pd.DataFrame()
-
-    prices = pd.concat(frames, axis=1)
-    prices.columns = labels
-    prices = prices.sort_index().ffill()
-    return prices.dropna(how="all")
+        return pd.DataFrame(), []
+    return load_history_frame(tickers, start, end, timed_out=timed_out)
+
+
+# results are kept for an hour; ones cut short by the deadline aren't kept at all,
+# the stragglers land on disk in the background and the next run picks them up
+@st.cache_data(ttl=3600, max_entries=256)
+def cached_backtest(
+    holdings_key: str,
+    portfolio_tickers: tuple[str, ...],
+    benchmark_tickers: tuple[str, ...],
+    start: date,
+    end: date,
+    _baseline: dict,
+    _trades: list,
+):
+    """Backtest against every benchmark in one pass, memoized on (holdings, date range).
+
+    The journal itself is left out of the cache key; holdings_key already hashes it.
+    """
+    # holdings and all benchmarks go out together, so latency is the slowest symbol
+    timed_out = []
+    history, missing = fetch_history(portfolio_tickers + benchmark_tickers, start, end, timed_out)
+    # restricted to tickers we successfully retrieved
+    result, available = journal_backtest(
+        history, _baseline, _trades, portfolio_tickers, benchmark_tickers
+    )
+    last_day = history.index[-1].date() if not history.empty else None
+    if timed_out:
+        raise PartialHistory((result, available, missing, last_day))
+    return result, available, missing, last_day
 
 
 today = date.today()
 default_start = today - timedelta(days=365)
 
+benchmark_map = dict(BENCHMARKS)
+
 col_period, col_benchmark = st.columns([2, 1])
 with col_period:
     date_range = st.date_input(
@@ -81,13 +93,21 @@ with col_period:
         (default_start, today),
         max_value=today,
     )
-# three main chosen benchmarks, can easily be changed but these represent the overall market well
+    custom_input = st.text_input(
+        "Custom benchmarks",
+        placeholder="Comma-separated tickers, e.g. QQQ, IWM",
+    )
+custom_tickers = list(
+    dict.fromkeys(t.strip().upper() for t in custom_input.split(",") if t.strip())
+)
+# the symbol list isn't exhaustive, so unlisted tickers are still tried
+unlisted = SYMBOLS.split(custom_tickers)[1]
+if unlisted:
+    st.caption(f"{', '.join(unlisted)} not in the symbol list; used if price history is found.")
+for ticker in custom_tickers:
+    benchmark_map.setdefault(ticker, ticker)
+
 with col_benchmark:
-    benchmark_map = {
-        "Vanguard 500 Index (VFINX)": "VFINX",
-        "SPDR S&P 500 ETF (SPY)": "SPY",
-        "Vanguard Total Market ETF (VTI)": "VTI",
-    }
     benchmark_label = st.selectbox(
         "Benchmark",
         list(benchmark_map.keys()),
@@ -105,52 +125,62 @@ if start_date >= end_date:
     st.error("The start date must be earlier than the end date.")
     st.stop()
 
-portfolio_tickers = tuple(portfolio.keys())
-price_history = fetch_history(portfolio_tickers, start_date, end_date)
-benchmark_history = fetch_history((benchmark_ticker,), start_date, end_date)
+# replay the trade journal so the backtest follows the real position history
+baseline, trades = load_journal(user, start_date)
+portfolio_tickers = tuple(
+    dict.fromkeys([*portfolio, *baseline, *(ticker for _, ticker, _ in trades)])
+)
+holdings_key = hashlib.sha256(
+    json.dumps([baseline, trades], sort_keys=True).encode("utf-8")
+).hexdigest()
+
+# every benchmark is evaluated up front, so flipping the selectbox is a cache hit
+try:
+    result, available_tickers, missing_tickers, last_day = cached_backtest(
+        holdings_key,
+        portfolio_tickers,
+        tuple(benchmark_map.values()),
+        start_date,
+        end_date,
+        baseline,
+        trades,
+    )
+except PartialHistory as partial:
+    result, available_tickers, missing_tickers, last_day = partial.outcome
 
-if price_history.empty:
+if not available_tickers:
     st.error("Unable to download price history for your portfolio holdings.")
     st.stop()
 
-if benchmark_history.empty:
-    st.error(f"Unable to download price history for benchmark {benchmark_ticker}.")
-    st.stop()
+skipped = [t for t in portfolio_tickers if t in missing_tickers]
+if skipped:
+    st.warning(f"No price history available for {', '.join(skipped)}; excluded from the backtest.")
 
-# restrict to tickers we successfully retrieved
-available_tickers = [col for col in portfolio_tickers if col in price_history.columns]
-if not available_tickers:
-    st.error("No overlapping price data found for your holdings in the selected range.")
+if result is None and last_day is not None and too_new_to_backtest(baseline, trades, last_day):
+    st.info(
+        "Your positions are too new to backtest: nothing was held before the latest "
+        "trading day in this period. Check back after they've been held a day."
+    )
     st.stop()
 
-shares = pd.Series(portfolio, dtype=float).loc[available_tickers]
-prices = price_history[available_tickers]
-
-# calculate the portfolio value through time
-portfolio_values = prices.multiply(shares, axis=1).sum(axis=1)
-portfolio_values = portfolio_values.dropna()
-
-benchmark_series = benchmark_history.iloc[:, 0].dropna()
-
-if portfolio_values.empty or benchmark_series.empty:
-    st.error("Not enough data to run the backtest over the selected dates.")
+if result is None:
+    st.error("Portfolio and benchmark did not share overlapping trading days.")
     st.stop()
 
-combined_index = pd.concat(
-    [portfolio_values.rename("Portfolio"), benchmark_series.rename("Benchmark")],
-    axis=1,
-    join="inner",
-).dropna()
-
-if combined_index.empty:
-    st.error("Portfolio and benchmark did not share overlapping trading days.")
+if benchmark_ticker not in result.benchmarks:
+    st.error(f"Unable to download price history for benchmark {benchmark_ticker}.")
     st.stop()
 
-normalized = combined_index / combined_index.iloc[0] * 100
-normalized = normalized.reset_index().rename(columns={"index": "Date"})
+growth = result.growth[["Portfolio", benchmark_ticker]].rename(
+    columns={benchmark_ticker: "Benchmark"}
+)
+normalized = growth * 100
+normalized = normalized.rename_axis("Date").reset_index()
 normalized = normalized.melt(
     id_vars="Date", value_vars=["Portfolio", "Benchmark"], var_name="Series", value_name="Value"
 )
+# long windows have thousands of days per series; only ship what the chart can draw
+normalized = downsample_long(normalized, "Date", "Value", "Series")
 
 line_chart = (
     alt.Chart(normalized)
@@ -168,38 +198,6 @@ line_chart = (
     .properties(height=420)
 )
 
-# performance metrics
-daily_returns = combined_index.pct_change().dropna()
-portfolio_daily = daily_returns["Portfolio"]
-benchmark_daily = daily_returns["Benchmark"]
-
-total_return = combined_index["Portfolio"].iloc[-1] / combined_index["Portfolio"].iloc[0] - 1
-benchmark_total_return = (
-    combined_index["Benchmark"].iloc[-1] / combined_index["Benchmark"].iloc[0] - 1
-)
-
-trading_days = len(portfolio_daily)
-
-if trading_days > 0:
-    annualization_factor = 252 / trading_days
-    annual_return = (1 + total_return) ** annualization_factor - 1
-    benchmark_annual_return = (1 + benchmark_total_return) ** annualization_factor - 1
-    annual_volatility = portfolio_daily.std(ddof=0) * np.sqrt(252)
-    benchmark_volatility = benchmark_daily.std(ddof=0) * np.sqrt(252)
-    if not np.isnan(annual_volatility) and not np.isclose(annual_volatility, 0.0):
-        sharpe = (portfolio_daily.mean() * 252) / annual_volatility
-    else:
-        sharpe = np.nan
-    tracking_error = (
-        (portfolio_daily - benchmark_daily).std(ddof=0) * np.sqrt(252)
-        if not benchmark_daily.empty
-        else np.nan
-    )
-else:
-    annual_return = benchmark_annual_return = np.nan
-    annual_volatility = benchmark_volatility = np.nan
-    sharpe = tracking_error = np.nan
-
 def format_pct(x: float) -> str:
     return "—" if pd.isna(x) else f"{x * 100:.2f}%"
 
@@ -208,30 +206,73 @@ def format_ratio(x: float) -> str:
     return "—" if pd.isna(x) else f"{x:.2f}"
 
 
-metrics_display = pd.DataFrame(
-    {
-        "Portfolio": [
-            format_pct(total_return),
-            format_pct(annual_return),
-            format_pct(annual_volatility),
-            format_ratio(sharpe),
-            format_pct(tracking_error),
+metrics_display = result.versus(benchmark_ticker).apply(
+    lambda row: row.map(format_ratio if row.name in RATIO_METRICS else format_pct),
+    axis=1,
+)
+
+drawdown = result.drawdown[["Portfolio", benchmark_ticker]].rename(
+    columns={benchmark_ticker: "Benchmark"}
+)
+drawdown = drawdown.rename_axis("Date").reset_index().melt(
+    id_vars="Date", var_name="Series", value_name="Drawdown"
+)
+# drawn in half-width columns, so half the points
+drawdown = downsample_long(drawdown, "Date", "Drawdown", "Series", chart_width=HALF_CHART_WIDTH)
+drawdown_chart = (
+    alt.Chart(drawdown)
+    .mark_line()
+    .encode(
+        x=alt.X("Date:T"),
+        y=alt.Y("Drawdown:Q", axis=alt.Axis(format="%")),
+        color=alt.Color("Series:N", title=""),
+        tooltip=[
+            alt.Tooltip("Date:T"),
+            alt.Tooltip("Series:N"),
+            alt.Tooltip("Drawdown:Q", format=".2%"),
         ],
-        "Benchmark": [
-            format_pct(benchmark_total_return),
-            format_pct(benchmark_annual_return),
-            format_pct(benchmark_volatility),
-            "—",
-            "—",
+    )
+    .properties(height=260)
+)
+
+rolling_sharpe = result.rolling_sharpe[["Portfolio", benchmark_ticker]].rename(
+    columns={benchmark_ticker: "Benchmark"}
+)
+rolling_sharpe = rolling_sharpe.rename_axis("Date").reset_index().melt(
+    id_vars="Date", var_name="Series", value_name="Sharpe"
+)
+rolling_sharpe = downsample_long(
+    rolling_sharpe, "Date", "Sharpe", "Series", chart_width=HALF_CHART_WIDTH
+)
+rolling_chart = (
+    alt.Chart(rolling_sharpe)
+    .mark_line()
+    .encode(
+        x=alt.X("Date:T"),
+        y=alt.Y("Sharpe:Q", title="Rolling Sharpe (3 months)"),
+        color=alt.Color("Series:N", title=""),
+        tooltip=[
+            alt.Tooltip("Date:T"),
+            alt.Tooltip("Series:N"),
+            alt.Tooltip("Sharpe:Q", format=".2f"),
+        ],
+    )
+    .properties(height=260)
+)
+
+contribution = result.contribution.rename_axis("Ticker").reset_index()
+contribution_chart = (
+    alt.Chart(contribution)
+    .mark_bar()
+    .encode(
+        x=alt.X("Ticker:N", sort="-y"),
+        y=alt.Y("Contribution:Q", title="Contribution to Return", axis=alt.Axis(format="%")),
+        tooltip=[
+            alt.Tooltip("Ticker:N"),
+            alt.Tooltip("Contribution:Q", format=".2%"),
         ],
-    },
-    index=[
-        "Total Return",
-        "Annualized Return",
-        "Annualized Volatility",
-        "Sharpe Ratio",
-        "Tracking Error vs Benchmark",
-    ],
+    )
+    .properties(height=260)
 )
 
 st.subheader("Performance Backtest")
@@ -243,14 +284,27 @@ st.dataframe(
     use_container_width=True,
 )
 
+col_drawdown, col_rolling = st.columns(2)
+with col_drawdown:
+    st.subheader("Drawdown")
+    st.altair_chart(drawdown_chart, use_container_width=True)
+with col_rolling:
+    st.subheader("Rolling Sharpe")
+    st.altair_chart(rolling_chart, use_container_width=True)
+
+st.subheader("Contribution by Holding")
+st.altair_chart(contribution_chart, use_container_width=True)
+
 
 st.caption(
-    "Performance metrics assume a constant allocation with no fees or dividends, "
-    "and use adjusted closing prices where available."
+    "Performance follows your recorded trades (positions added before trades were "
+    "journaled count as held throughout), ignores fees and dividends, "
+    "and uses adjusted closing prices where available."
 )
 
 # code for the sidebar
 st.sidebar.success(f"Logged in as {user}")
 if st.sidebar.button("Log out", use_container_width=True):
     st.session_state.user = None
-    st.switch_page("home.py")
\ No newline at end of file
+    st.switch_page("home.py")
+render_debug_panel(user)
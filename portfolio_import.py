@@ -0,0 +1,270 @@
+import csv
+import io
+from dataclasses import dataclass, field
+from datetime import date, datetime
+
+from symbols import SUGGEST_SUFFIXES, SYMBOLS, looks_like_symbol, normalize
+
+# header names brokers use for each field, compared lowercased
+SYMBOL_COLUMNS = ("symbol", "ticker", "security symbol", "ticker symbol", "instrument", "code")
+QUANTITY_COLUMNS = ("quantity", "shares", "qty", "units", "share quantity", "no. of shares")
+DATE_COLUMNS = ("trade date", "date", "transaction date", "activity date", "run date", "settlement date")
+ACTION_COLUMNS = ("action", "side", "transaction type", "activity", "type", "buy/sell")
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%d-%b-%Y", "%b %d, %Y", "%Y/%m/%d")
+# exports often open with account details before the real header row
+MAX_PREAMBLE_ROWS = 50
+# how often (rows) the progress callback fires
+PROGRESS_EVERY = 1000
+# rejected rows kept for display; the rest are only counted
+MAX_REJECTED = 200
+
+
+@dataclass
+class Lot:
+    ticker: str
+    action: str  # "buy" or "sell"
+    shares: float
+    trade_date: date | None
+    line: int
+
+
+@dataclass
+class ImportResult:
+    lots: list[Lot] = field(default_factory=list)
+    rejected: list[tuple[int, str, str]] = field(default_factory=list)  # (line, value, reason)
+    rejected_count: int = 0
+    ignored: int = 0  # rows that aren't trades (dividends, transfers, totals)
+    rows: int = 0
+
+    def reject(self, line: int, value: str, reason: str) -> None:
+        self.rejected_count += 1
+        if len(self.rejected) < MAX_REJECTED:
+            self.rejected.append((line, value, reason))
+
+    def tickers(self) -> list[str]:
+        return list(dict.fromkeys(lot.ticker for lot in self.lots))
+
+    def net_positions(self) -> dict:
+        net = {}
+        for lot in self.lots:
+            net[lot.ticker] = net.get(lot.ticker, 0) + (lot.shares if lot.action == "buy" else -lot.shares)
+        return net
+
+    def undated(self) -> int:
+        return sum(1 for lot in self.lots if lot.trade_date is None)
+
+    def trades(self, as_of: date | None = None) -> list[tuple]:
+        """Lots merged per (ticker, action, date) and ordered by date, as
+        (ticker, action, shares, trade_date) ready for storage.import_trades().
+
+        Lots without a trade date are dated ``as_of``, today when not given.
+        """
+        as_of = as_of or date.today()
+        merged = {}
+        for lot in self.lots:
+            key = (lot.ticker, lot.action, lot.trade_date or as_of)
+            merged[key] = merged.get(key, 0) + lot.shares
+        ordered = sorted(merged.items(), key=lambda kv: (kv[0][2], kv[0][1] == "sell"))
+        return [(ticker, action, shares, day) for (ticker, action, day), shares in ordered]
+
+
+def _clean(raw: str) -> str:
+    return normalize(raw).lstrip("$").rstrip("*")
+
+
+def resolve_symbol(raw: str) -> tuple[str | None, str]:
+    """Map a broker's spelling onto a symbol-master ticker: (ticker, "") or (None, reason)."""
+    symbol = _clean(raw)
+    if not symbol:
+        return None, "no symbol"
+    candidates = [symbol]
+    # BRK.B / BRK/B are BRK-B on Yahoo
+    if "." in symbol or "/" in symbol:
+        candidates.append(symbol.replace(".", "-").replace("/", "-"))
+    # RY:CA, TSX:RY, RY.TSX, RY-CT all mean RY.TO
+    for sep in (":", ".", "-", " "):
+        head, _, tail = symbol.partition(sep)
+        if tail in ("CA", "TSX", "CT", "CN"):
+            candidates.append(f"{head}.TO")
+        elif head in ("TSX", "TSE"):
+            candidates.append(f"{tail}.TO")
+    for candidate in candidates:
+        if SYMBOLS.is_known(candidate):
+            return candidate, ""
+    # bare TSX or crypto tickers resolve only when exactly one listing fits
+    suffixed = [symbol + s for s in SUGGEST_SUFFIXES if SYMBOLS.is_known(symbol + s)]
+    if len(suffixed) == 1:
+        return suffixed[0], ""
+    suggestions = SYMBOLS.suggest(symbol)
+    hint = f", did you mean {' or '.join(suggestions)}?" if suggestions else ""
+    return None, f"not a listed symbol{hint}"
+
+
+def _number(text: str) -> float | None:
+    text = text.strip().replace(",", "").replace("$", "")
+    if not text:
+        return None
+    negative = text.startswith("(") and text.endswith(")")
+    try:
+        value = float(text.strip("()"))
+    except ValueError:
+        return None
+    return -value if negative else value
+
+
+def _date(text: str) -> date | None:
+    text = text.strip().split(" as of ")[0]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _action(text: str) -> str | None:
+    text = text.strip().upper()
+    if text in ("B", "BUY") or any(w in text for w in ("BUY", "BOUGHT", "REINVEST", "PURCHASE")):
+        return "buy"
+    if text in ("S", "SELL") or any(w in text for w in ("SELL", "SOLD")):
+        return "sell"
+    return None
+
+
+def _cell(row: list[str], i: int | None) -> str:
+    return row[i] if i is not None and i < len(row) else ""
+
+
+def _find(header: list[str], names: tuple) -> int | None:
+    for name in names:
+        if name in header:
+            return header.index(name)
+    return None
+
+
+def parse_lots(
+    stream, total_bytes: int | None = None, on_progress=None, verify=None
+) -> ImportResult:
+    """Stream a CSV export into validated lots, one row at a time.
+
+    Works with plain position lists (symbol, quantity) and with broker
+    activity exports (symbol, quantity, date, buy/sell). Without a column
+    whose values read as buy/sell, a negative quantity is a sale. ``on_progress(fraction, rows)`` is
+    called every ``PROGRESS_EVERY`` rows when ``total_bytes`` is known.
+
+    The symbol list isn't exhaustive, so symbols it doesn't know can be
+    confirmed with ``verify(symbols) -> symbols that exist``, called once
+    with all of them after the file is read.
+    """
+    if isinstance(stream, io.TextIOBase):
+        return _parse(stream, stream, total_bytes, on_progress, verify)
+    # utf-8-sig drops the BOM Excel puts on exported CSVs
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        return _parse(text, stream, total_bytes, on_progress, verify)
+    finally:
+        # hand the caller's file back open
+        text.detach()
+
+
+def _parse(stream, raw, total_bytes, on_progress, verify) -> ImportResult:
+    reader = csv.reader(stream)
+    result = ImportResult()
+
+    columns = None
+    for row in reader:
+        header = [cell.strip().lower() for cell in row]
+        symbol_col, qty_col = _find(header, SYMBOL_COLUMNS), _find(header, QUANTITY_COLUMNS)
+        if symbol_col is not None and qty_col is not None:
+            columns = (symbol_col, qty_col, _find(header, DATE_COLUMNS), _find(header, ACTION_COLUMNS))
+            break
+        if reader.line_num >= MAX_PREAMBLE_ROWS:
+            break
+    if columns is None:
+        result.reject(reader.line_num, "", "no header row with a symbol and a quantity column")
+        return result
+    symbol_col, qty_col, date_col, action_col = columns
+
+    resolved = {}  # raw symbol -> (ticker, reason), exports repeat symbols a lot
+    unlisted = []  # (lot, raw symbol, reason) waiting on verify()
+    # generic headers like "Type" can hold Cash/Margin rather than buy/sell, so the
+    # action column only counts once one of its values parses; until then rows are
+    # held back, and if none ever does, the quantity's sign decides instead
+    action_confirmed = action_col is None
+    undecided = []
+
+    def emit(kind, item):
+        if kind == "lot":
+            result.lots.append(item)
+        elif kind == "unlisted":
+            unlisted.append(item)
+        else:
+            result.reject(*item)
+
+    for row in reader:
+        result.rows += 1
+        if on_progress is not None and total_bytes and result.rows % PROGRESS_EVERY == 0:
+            try:
+                on_progress(min(raw.tell() / total_bytes, 1.0), result.rows)
+            except (AttributeError, OSError):
+                pass
+        line = reader.line_num
+        raw_symbol, raw_qty = _cell(row, symbol_col).strip(), _cell(row, qty_col)
+        if not raw_symbol and not raw_qty.strip():
+            # blank lines, totals and disclaimers at the bottom of the export
+            result.ignored += 1
+            continue
+
+        action = _action(_cell(row, action_col)) if action_col is not None else None
+        if action is not None and not action_confirmed:
+            # it's a real buy/sell column: rows held back so far weren't trades
+            action_confirmed = True
+            result.ignored += len(undecided)
+            undecided.clear()
+        if action is None and action_confirmed and action_col is not None:
+            # dividends, interest, transfers: not trades
+            result.ignored += 1
+            continue
+
+        shares = _number(raw_qty)
+        if shares is None or shares == 0:
+            outcome = ("reject", (line, raw_qty, f"no usable quantity for {raw_symbol or 'row'}"))
+        else:
+            if action is None:
+                action = "sell" if shares < 0 else "buy"
+            shares = abs(shares)
+            if raw_symbol not in resolved:
+                resolved[raw_symbol] = resolve_symbol(raw_symbol)
+            ticker, reason = resolved[raw_symbol]
+
+            trade_date = _date(_cell(row, date_col)) if date_col is not None else None
+            if trade_date is not None and trade_date > date.today():
+                trade_date = date.today()
+            if ticker is not None:
+                outcome = ("lot", Lot(ticker, action, shares, trade_date, line))
+            elif verify is not None and looks_like_symbol(_clean(raw_symbol)):
+                lot = Lot(_clean(raw_symbol), action, shares, trade_date, line)
+                outcome = ("unlisted", (lot, raw_symbol, reason))
+            else:
+                outcome = ("reject", (line, raw_symbol, reason))
+
+        if action_confirmed:
+            emit(*outcome)
+        else:
+            undecided.append(outcome)
+
+    # the action column never held a buy or sell, so it wasn't one
+    for outcome in undecided:
+        emit(*outcome)
+
+    if unlisted:
+        # one batched lookup for everything the symbol list didn't know
+        confirmed = set(verify(list(dict.fromkeys(lot.ticker for lot, _, _ in unlisted))))
+        for lot, raw_symbol, reason in unlisted:
+            if lot.ticker in confirmed:
+                result.lots.append(lot)
+            else:
+                result.reject(lot.line, raw_symbol, "not a listed symbol and no market data found")
+    if on_progress is not None:
+        on_progress(1.0, result.rows)
+    return result
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import os
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+
+from services import feather, pa, pd, yf
+
+# "yahoo" (default) or "recorded:<dir>" for the offline provider
+PROVIDER_ENV = "CPORTFOLIO_MARKET_DATA"
+BAR_FIELDS = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+
+
+class MarketDataProvider:
+    """Where market data comes from. Both methods return frames shaped like
+    yfinance's, so the parsing in market_data works unchanged:
+
+    - download(): columns are a (ticker, field) MultiIndex
+    - history(): one symbol, plain field columns
+    """
+
+    name = "base"
+
+    def download(self, tickers: list[str], period: str = "2d", interval: str = "1d") -> pd.DataFrame:
+        raise NotImplementedError
+
+    def history(
+        self,
+        symbol: str,
+        start: date | None = None,
+        end: date | None = None,
+        period: str | None = None,
+        interval: str = "1d",
+        auto_adjust: bool = True,
+        timeout: float = 10,
+    ) -> pd.DataFrame:
+        raise NotImplementedError
+
+
+class YahooProvider(MarketDataProvider):
+    name = "yahoo"
+
+    def download(self, tickers, period="2d", interval="1d"):
+        return yf.download(
+            tickers,
+            period=period,
+            interval=interval,
+            progress=False,
+            group_by="ticker",
+        )
+
+    def history(self, symbol, start=None, end=None, period=None, interval="1d",
+                auto_adjust=True, timeout=10):
+        # yf.Ticker rather than yf.download so this is safe to run from a thread pool
+        if period is not None:
+            return yf.Ticker(symbol).history(
+                period=period, interval=interval, auto_adjust=auto_adjust, timeout=timeout
+            )
+        return yf.Ticker(symbol).history(
+            start=start, end=end, interval=interval, auto_adjust=auto_adjust, timeout=timeout
+        )
+
+
+def _period_rows(period: str) -> int:
+    # the app only asks for short day periods ("2d")
+    return int(period.rstrip("d"))
+
+
+class RecordedProvider(MarketDataProvider):
+    """Offline provider serving daily bars from ``<root>/<SYMBOL>.feather``.
+
+    With ``upstream`` set it records: symbols it doesn't have are fetched from
+    upstream and saved, so a session against Yahoo can be replayed offline.
+    Unknown symbols come back empty, just like a bad ticker on Yahoo.
+    """
+
+    name = "recorded"
+    # how much history a recording run asks upstream for
+    RECORD_YEARS = 10
+
+    def __init__(self, root, upstream: MarketDataProvider | None = None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.upstream = upstream
+        self._lock = threading.Lock()
+
+    def _path(self, symbol: str) -> Path:
+        return self.root / f"{symbol.replace('/', '_').replace('^', '_')}.feather"
+
+    def bars(self, symbol: str) -> pd.DataFrame:
+        path = self._path(symbol)
+        if not path.exists():
+            if self.upstream is None:
+                return pd.DataFrame(columns=BAR_FIELDS)
+            return self.record(symbol)
+        frame = feather.read_table(path, memory_map=True).to_pandas()
+        return frame.set_index("Date")
+
+    def record(self, symbol: str) -> pd.DataFrame:
+        end = date.today() + timedelta(days=1)
+        start = end - timedelta(days=365 * self.RECORD_YEARS)
+        bars = self.upstream.history(symbol, start=start, end=end, auto_adjust=False)
+        if bars is None or bars.empty:
+            return pd.DataFrame(columns=BAR_FIELDS)
+        bars = bars.reindex(columns=BAR_FIELDS)
+        bars.index = pd.to_datetime(bars.index).tz_localize(None)
+        frame = bars.rename_axis("Date").reset_index()
+        with self._lock:
+            feather.write_feather(
+                pa.Table.from_pandas(frame, preserve_index=False),
+                self._path(symbol),
+                compression="uncompressed",
+            )
+        return bars
+
+    def download(self, tickers, period="2d", interval="1d"):
+        frames = {t: self.bars(t).tail(_period_rows(period)) for t in tickers}
+        frames = {t: f for t, f in frames.items() if not f.empty}
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1)
+
+    def history(self, symbol, start=None, end=None, period=None, interval="1d",
+                auto_adjust=True, timeout=10):
+        bars = self.bars(symbol)
+        if period is not None:
+            bars = bars.tail(_period_rows(period))
+        else:
+            # end is exclusive, like yfinance
+            if start is not None:
+                bars = bars[bars.index >= pd.Timestamp(start)]
+            if end is not None:
+                bars = bars[bars.index < pd.Timestamp(end)]
+        return bars.drop(columns="Adj Close") if auto_adjust else bars
+
+
+def provider_from_env(value: str | None = None) -> MarketDataProvider:
+    value = value if value is not None else os.environ.get(PROVIDER_ENV, "yahoo")
+    kind, _, arg = value.partition(":")
+    if kind == "recorded":
+        return RecordedProvider(arg or Path(__file__).resolve().parent / "data" / "recorded")
+    if kind == "recording":
+        return RecordedProvider(
+            arg or Path(__file__).resolve().parent / "data" / "recorded", upstream=YahooProvider()
+        )
+    return YahooProvider()
+
+
+_provider = provider_from_env()
+
+
+def get_provider() -> MarketDataProvider:
+    return _provider
+
+
+def set_provider(provider: MarketDataProvider) -> MarketDataProvider:
+    """Swap the process-wide provider (e.g. for offline runs); returns the old one."""
+    global _provider
+    previous, _provider = _provider, provider
+    return previous
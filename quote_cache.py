@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, time as dtime
+from zoneinfo import ZoneInfo
+
+# quotes move constantly while the market is open, barely at all once it's closed
+MARKET_OPEN_TTL = 60
+MARKET_CLOSED_TTL = 30 * 60
+# sized for every ticker in a large user store; a smaller cache thrashes on big
+# portfolios because each rerun evicts the symbols it's about to read
+MAX_ENTRIES = 20_000
+
+_NEW_YORK = ZoneInfo("America/New_York")
+
+
+def market_is_open(now: datetime | None = None) -> bool:
+    """Rough NYSE regular-session check (ignores holidays)."""
+    now = (now or datetime.now(_NEW_YORK)).astimezone(_NEW_YORK)
+    if now.weekday() >= 5:
+        return False
+    return dtime(9, 30) <= now.time() < dtime(16, 0)
+
+
+class QuoteCache:
+    """Process-wide per-symbol quote cache with a freshness TTL and LRU eviction."""
+
+    def __init__(
+        self,
+        open_ttl: float = MARKET_OPEN_TTL,
+        closed_ttl: float = MARKET_CLOSED_TTL,
+        max_entries: int = MAX_ENTRIES,
+    ):
+        self.open_ttl = open_ttl
+        self.closed_ttl = closed_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # ticker -> (stored_at, quote)
+        self._lock = threading.Lock()
+
+    def ttl(self) -> float:
+        return self.open_ttl if market_is_open() else self.closed_ttl
+
+    def get_many(self, tickers) -> tuple[dict, list]:
+        """Return (fresh quotes, tickers that need fetching)."""
+        now = time.monotonic()
+        ttl = self.ttl()
+        found, missing = {}, []
+        with self._lock:
+            for ticker in tickers:
+                entry = self._entries.get(ticker)
+                if entry is not None and now - entry[0] < ttl:
+                    self._entries.move_to_end(ticker)
+                    found[ticker] = entry[1]
+                    self.hits += 1
+                else:
+                    missing.append(ticker)
+                    self.misses += 1
+        return found, missing
+
+    def put_many(self, quotes: dict) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for ticker, quote in quotes.items():
+                self._entries[ticker] = (now, quote)
+                self._entries.move_to_end(ticker)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# one cache shared by every session in the server process
+QUOTES = QuoteCache()
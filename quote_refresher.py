@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+
+from instrumentation import count, span
+from market_data import fetch_quotes
+from quote_cache import MARKET_OPEN_TTL, QUOTES, QuoteCache, market_is_open
+from storage import held_tickers
+
+# seconds between refresh passes, kept under the open-market TTL so quotes the
+# dashboards read never expire while someone is looking. 0 turns the refresher off
+REFRESH_INTERVAL = float(os.environ.get("CPORTFOLIO_QUOTE_REFRESH", MARKET_OPEN_TTL * 0.75))
+# a user counts as active for this long after their last dashboard run
+ACTIVE_WINDOW = 15 * 60
+# everyone else's tickers are only refreshed on every n-th pass
+INACTIVE_EVERY = 5
+# cap per pass so a huge user base can't turn one pass into minutes of downloads
+MAX_SYMBOLS_PER_PASS = 5000
+
+
+class QuoteRefresher:
+    """Keeps the shared quote cache warm from a background thread.
+
+    Every pass refreshes the tickers of recently active users; the rest of the
+    user store's tickers ride along every ``INACTIVE_EVERY`` passes. Nothing is
+    fetched while the market is closed, the closed-market TTL covers that.
+    The thread only starts once a dashboard calls touch().
+    """
+
+    def __init__(
+        self,
+        cache: QuoteCache = QUOTES,
+        interval: float = REFRESH_INTERVAL,
+        active_window: float = ACTIVE_WINDOW,
+        max_symbols: int = MAX_SYMBOLS_PER_PASS,
+    ):
+        self.cache = cache
+        self.interval = interval
+        self.active_window = active_window
+        self.max_symbols = max_symbols
+        self.passes = 0
+        self.last_refresh = None  # wall-clock time of the last pass that fetched
+        self._active = {}  # username -> last seen (monotonic)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def touch(self, username: str) -> None:
+        """Mark a user as active and make sure the refresher is running."""
+        with self._lock:
+            self._active[username] = time.monotonic()
+        self.start()
+
+    def active_users(self) -> list[str]:
+        cutoff = time.monotonic() - self.active_window
+        with self._lock:
+            for username in [u for u, seen in self._active.items() if seen < cutoff]:
+                del self._active[username]
+            # most recent first, so they win if the pass gets capped
+            return sorted(self._active, key=self._active.get, reverse=True)
+
+    def symbols(self, include_inactive: bool = True) -> list[str]:
+        """Tickers to refresh: active users' first, then everyone else's."""
+        symbols = dict.fromkeys(held_tickers(self.active_users()))
+        if include_inactive:
+            symbols.update(dict.fromkeys(held_tickers()))
+        # refreshing more than the cache holds would just evict what we fetched
+        limit = min(self.max_symbols, self.cache.max_entries)
+        return list(symbols)[:limit]
+
+    def refresh_once(self) -> int:
+        """One refresh pass; returns how many quotes came back."""
+        include_inactive = self.passes % INACTIVE_EVERY == 0
+        self.passes += 1
+        symbols = self.symbols(include_inactive)
+        if not symbols:
+            return 0
+        with span("quote_refresh"):
+            fetched = fetch_quotes(symbols)
+        self.cache.put_many(fetched)
+        self.last_refresh = time.time()
+        count("quote_refresh_symbols", len(fetched))
+        return len(fetched)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if market_is_open():
+                try:
+                    self.refresh_once()
+                except Exception:
+                    # a failed pass just leaves the cache to on-demand fetches
+                    count("quote_refresh_errors")
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="quote-refresher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+
+
+# one refresher for the whole server process
+REFRESHER = QuoteRefresher()
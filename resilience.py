@@ -0,0 +1,148 @@
+import threading
+import time
+
+from instrumentation import count
+
+# a failing key is skipped this long after its first failure, doubling on each
+# consecutive failure up to the cap
+BACKOFF_BASE = 30
+BACKOFF_MAX = 60 * 60
+# consecutive failures that open an endpoint's circuit
+BREAKER_THRESHOLD = 5
+# how long an open circuit fails fast before letting one trial call through
+BREAKER_COOLDOWN = 30
+
+
+class BreakerOpen(Exception):
+    """Raised instead of calling an endpoint whose circuit is open."""
+
+
+class Backoff:
+    """Negative cache with exponential backoff, keyed by symbol (or anything).
+
+    A key that failed is skipped until its retry time; a success forgets it.
+    """
+
+    def __init__(self, name: str, base: float = BACKOFF_BASE, cap: float = BACKOFF_MAX):
+        self.name = name
+        self.base = base
+        self.cap = cap
+        self._entries = {}  # key -> (consecutive failures, retry at)
+        self._lock = threading.Lock()
+
+    def blocked(self, key) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            blocked = entry is not None and time.monotonic() < entry[1]
+        if blocked:
+            count("backoff_skips", backoff=self.name)
+        return blocked
+
+    def partition(self, keys) -> tuple[list, list]:
+        """(keys worth trying now, keys still backing off)."""
+        now = time.monotonic()
+        allowed, blocked = [], []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                (blocked if entry is not None and now < entry[1] else allowed).append(key)
+        count("backoff_skips", len(blocked), backoff=self.name)
+        return allowed, blocked
+
+    def failure(self, key) -> None:
+        with self._lock:
+            failures = self._entries.get(key, (0, 0.0))[0] + 1
+            delay = min(self.base * 2 ** (failures - 1), self.cap)
+            self._entries[key] = (failures, time.monotonic() + delay)
+
+    def success(self, key) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def backing_off(self) -> list:
+        now = time.monotonic()
+        with self._lock:
+            return [key for key, (_, retry_at) in self._entries.items() if now < retry_at]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class CircuitBreaker:
+    """Per-endpoint circuit: after ``threshold`` consecutive failures it opens and
+    callers fail fast for ``cooldown`` seconds. Then one trial call is let through;
+    success closes the circuit, failure opens it for another cooldown."""
+
+    def __init__(
+        self, name: str, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN
+    ):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"  # closed -> open -> half_open -> closed | open
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != "closed"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = time.monotonic()
+            if now - self.opened_at >= self.cooldown:
+                # one trial per cooldown, so a trial that never reports back can't wedge it
+                self.state = "half_open"
+                self.opened_at = now
+                return True
+        count("breaker_rejected", endpoint=self.name)
+        return False
+
+    def check(self) -> None:
+        if not self.allow():
+            raise BreakerOpen(self.name)
+
+    def success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.threshold:
+                if self.state != "open":
+                    count("breaker_opened", endpoint=self.name)
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def reset(self) -> None:
+        self.success()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(endpoint: str) -> CircuitBreaker:
+    """The process-wide circuit for one endpoint."""
+    with _breakers_lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = CircuitBreaker(endpoint)
+        return _breakers[endpoint]
+
+
+def open_endpoints() -> list[str]:
+    """Endpoints currently failing fast (open or waiting on a trial call)."""
+    with _breakers_lock:
+        return sorted(name for name, b in _breakers.items() if b.is_open)
+
+
+def reset_breakers() -> None:
+    with _breakers_lock:
+        for b in _breakers.values():
+            b.reset()
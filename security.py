@@ -1,15 +1,131 @@
-from argon2 import PasswordHasher, exceptions
+import os
+import threading
+import time
+from typing import NamedTuple
+
+from argon2 import Parameters, PasswordHasher, Type, exceptions, profiles
+
+from instrumentation import timed
+
+# named Argon2 cost profiles; pick one with CPORTFOLIO_HASH_PROFILE
+PROFILES = {
+    # argon2-cffi's default (64 MiB, t=3, p=4), what every existing hash uses
+    "rfc9106_low": profiles.RFC_9106_LOW_MEMORY,
+    # OWASP's minimum (19 MiB, t=2, p=1), for small hosts with bursty logins
+    "owasp": Parameters(
+        type=Type.ID,
+        version=19,
+        salt_len=16,
+        hash_len=32,
+        time_cost=2,
+        memory_cost=19 * 1024,
+        parallelism=1,
+    ),
+    "rfc9106_high": profiles.RFC_9106_HIGH_MEMORY,
+}
+HASH_PROFILE = os.environ.get("CPORTFOLIO_HASH_PROFILE", "rfc9106_low")
+
+# each verification holds memory_cost KiB, so cap how many run at once
+MAX_CONCURRENT_HASHES = int(os.environ.get("CPORTFOLIO_MAX_CONCURRENT_HASHES", "2"))
+# after this many failures a username is locked out instead of paying for argon2
+MAX_FAILED_ATTEMPTS = 5
+LOCKOUT_SECONDS = 60
+MAX_LOCKOUT_SECONDS = 15 * 60
+# failures are forgotten this long after the last one, once any lockout has passed
+FAILURE_MEMORY = MAX_LOCKOUT_SECONDS
+# hard cap on usernames tracked at once, oldest failures are dropped first
+MAX_TRACKED_USERNAMES = 100_000
 
 # initialize Argon2 hasher (modern and secure)
-ph = PasswordHasher()
+ph = PasswordHasher.from_parameters(PROFILES[HASH_PROFILE])
+_slots = threading.BoundedSemaphore(MAX_CONCURRENT_HASHES)
+
+
+class LoginResult(NamedTuple):
+    ok: bool
+    # set when the stored hash was made with an older profile and should be replaced
+    new_hash: str | None = None
+    throttled: bool = False
+
+
+class _FailureThrottle:
+    """Per-username failure counter with an exponentially growing lockout.
+
+    Entries are kept in order of last failure; ones whose lockout has passed
+    and that haven't failed for FAILURE_MEMORY seconds are dropped, and past
+    MAX_TRACKED_USERNAMES the oldest go first, so guessing random usernames
+    can't grow memory without bound.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._failures = {}  # username -> (count, locked_until, last_failure)
+
+    def locked(self, username: str) -> bool:
+        with self._lock:
+            _, locked_until, _ = self._failures.get(username, (0, 0.0, 0.0))
+            return time.monotonic() < locked_until
+
+    def failed(self, username: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            count, _, _ = self._failures.pop(username, (0, 0.0, 0.0))
+            count += 1
+            locked_until = 0.0
+            if count >= MAX_FAILED_ATTEMPTS:
+                delay = LOCKOUT_SECONDS * 2 ** (count - MAX_FAILED_ATTEMPTS)
+                locked_until = now + min(delay, MAX_LOCKOUT_SECONDS)
+            # re-inserted at the end, so the dict stays ordered by last failure
+            self._failures[username] = (count, locked_until, now)
+            self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        # caller holds the lock
+        while self._failures:
+            oldest = next(iter(self._failures))
+            _, locked_until, last_failure = self._failures[oldest]
+            stale = now >= locked_until and now - last_failure >= FAILURE_MEMORY
+            if not stale and len(self._failures) <= MAX_TRACKED_USERNAMES:
+                break
+            del self._failures[oldest]
+
+    def succeeded(self, username: str) -> None:
+        with self._lock:
+            self._failures.pop(username, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._failures)
+
+
+_throttle = _FailureThrottle()
+
 
 def hash_password(plain: str) -> str:
     # return a secure Argon2id hash of the plaintext password
-    return ph.hash(plain)
+    with _slots:
+        return ph.hash(plain)
+
 
+@timed("verify_password")
 def verify_password(hash_str: str, candidate: str) -> bool:
     # verify that the candidate matches the stored hash
     try:
-        return ph.verify(hash_str, candidate)
-    except exceptions.VerifyMismatchError:
-        return False
\ No newline at end of file
+        with _slots:
+            return ph.verify(hash_str, candidate)
+    except (exceptions.VerifyMismatchError, exceptions.InvalidHashError):
+        return False
+
+
+def verify_login(username: str, hash_str: str | None, candidate: str) -> LoginResult:
+    """Throttled password check that also upgrades hashes from older cost profiles."""
+    if _throttle.locked(username):
+        return LoginResult(ok=False, throttled=True)
+    if hash_str is None or not verify_password(hash_str, candidate):
+        _throttle.failed(username)
+        return LoginResult(ok=False)
+
+    _throttle.succeeded(username)
+    if ph.check_needs_rehash(hash_str):
+        return LoginResult(ok=True, new_hash=hash_password(candidate))
+    return LoginResult(ok=True)
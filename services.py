@@ -0,0 +1,67 @@
+import importlib
+import sys
+import threading
+import types
+
+# imports that cost a noticeable slice of a cold start. Modules and pages take
+# them from here so a page that redirects to login, or stops on an empty
+# portfolio, never loads them
+HEAVY_MODULES = (
+    "pandas",
+    "numpy",
+    "pyarrow",
+    "altair",
+    "yfinance",
+    "requests",
+    "huggingface_hub",
+)
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in that imports the real module on first attribute access.
+
+    Attribute reads and writes go straight through to the real module, so
+    monkeypatching either one patches both.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _load(self) -> types.ModuleType:
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    object.__setattr__(self, "_module", importlib.import_module(self.__name__))
+                module = self._module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+
+pd = LazyModule("pandas")
+np = LazyModule("numpy")
+pa = LazyModule("pyarrow")
+feather = LazyModule("pyarrow.feather")
+alt = LazyModule("altair")
+yf = LazyModule("yfinance")
+requests = LazyModule("requests")
+huggingface_hub = LazyModule("huggingface_hub")
+
+
+def loaded_heavy_modules() -> list[str]:
+    """Which of HEAVY_MODULES this process has actually imported so far."""
+    return [name for name in HEAVY_MODULES if name in sys.modules]
@@ -0,0 +1,88 @@
+import threading
+from concurrent.futures import Future
+
+from instrumentation import count
+
+# how long a caller waits on someone else's in-flight call before giving up on it
+WAIT_TIMEOUT = 60
+
+_MISSING = object()
+
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into one upstream call.
+
+    The first caller for a key runs the function; anyone asking for that key
+    while it's running waits for the same result instead of calling again.
+    Nothing is cached once the call finishes, that's left to the callers.
+    """
+
+    def __init__(self, name: str, wait_timeout: float = WAIT_TIMEOUT):
+        self.name = name
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> Future while in flight
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            count("singleflight_shared", flight=self.name)
+            return future.result(timeout=self.wait_timeout)
+        try:
+            result = fn(*args)
+        except BaseException as exc:
+            self._finish({key: future}, error=exc)
+            raise
+        self._finish({key: future}, {key: result})
+        return result
+
+    def do_many(self, keys, fn) -> dict:
+        """Batch form: ``fn(keys)`` returns {key: value} for the keys this caller
+        owns; keys already in flight elsewhere are waited on. Keys nobody could
+        produce are left out of the result."""
+        owned, waiting = {}, {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                future = self._calls.get(key)
+                if future is None:
+                    owned[key] = self._calls[key] = Future()
+                else:
+                    waiting[key] = future
+        if waiting:
+            count("singleflight_shared", len(waiting), flight=self.name)
+
+        results = {}
+        if owned:
+            try:
+                fetched = fn(list(owned))
+            except BaseException as exc:
+                self._finish(owned, error=exc)
+                raise
+            self._finish(owned, fetched)
+            results.update((k, v) for k, v in fetched.items() if k in owned)
+        for key, future in waiting.items():
+            try:
+                value = future.result(timeout=self.wait_timeout)
+            except Exception:
+                continue
+            if value is not _MISSING:
+                results[key] = value
+        return results
+
+    def _finish(self, futures: dict, results: dict | None = None, error=None) -> None:
+        with self._lock:
+            for key in futures:
+                self._calls.pop(key, None)
+        for key, future in futures.items():
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results.get(key, _MISSING))
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
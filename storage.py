@@ -1,16 +1,520 @@
 import json
+import sqlite3
+import threading
+import time
+from datetime import date
 from pathlib import Path
 
+from instrumentation import cache_result, timed
+
 # Always point to the same file:
 USERS_PATH = Path(__file__).resolve().parent / "data" / "users.json"
 USERS_PATH.parent.mkdir(parents=True, exist_ok=True)
+# users now live in sqlite, the json file is only read once to migrate
+DB_PATH = USERS_PATH.with_name("users.db")
+# the checked-in file is users.JSON, older checkouts wrote users.json
+LEGACY_PATHS = (USERS_PATH, USERS_PATH.with_suffix(".JSON"))
+
+_local = threading.local()
+_migrate_lock = threading.Lock()
+# databases whose schema and opening snapshots this process has already set up
+_prepared = set()
+_prepare_lock = threading.Lock()
+# how often (seconds) the cache stats the db files to notice other processes' writes
+CHANGE_CHECK_INTERVAL = 1.0
+# fold the trade journal into a holdings snapshot once this many trades pile up
+COMPACT_EVERY = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS positions (
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    ticker   TEXT NOT NULL,
+    shares   NUMERIC NOT NULL,
+    PRIMARY KEY (username, ticker)
+);
+-- append-only; positions above is just the current-state projection of it
+CREATE TABLE IF NOT EXISTS trades (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    username   TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    ticker     TEXT NOT NULL,
+    trade_date TEXT NOT NULL,
+    action     TEXT NOT NULL CHECK (action IN ('buy', 'sell', 'remove')),
+    shares     NUMERIC NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trades_by_user ON trades (username, id);
+-- holdings after every trade up to last_trade_id; as_of is the latest trade date
+-- folded in, NULL for the opening balance (positions that predate the journal)
+CREATE TABLE IF NOT EXISTS snapshots (
+    username      TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    last_trade_id INTEGER NOT NULL,
+    as_of         TEXT,
+    holdings      TEXT NOT NULL,
+    PRIMARY KEY (username, last_trade_id)
+);
+"""
+
+
+def _connect() -> sqlite3.Connection:
+    # one connection per thread, streamlit runs each session on its own thread
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        _local.conn = conn
+        _prepare(conn)
+    return conn
+
+
+def _prepare(conn: sqlite3.Connection) -> None:
+    """Schema, json migration and opening snapshots, once per database per process.
+
+    Streamlit runs every script run on a fresh thread, so doing this per
+    connection made the next rerun of every session scan all users.
+    """
+    with _prepare_lock:
+        if DB_PATH in _prepared:
+            return
+        conn.executescript(SCHEMA)
+        _migrate_json(conn)
+        _ensure_opening_snapshots(conn)
+        _prepared.add(DB_PATH)
+
+
+class _transaction:
+    """BEGIN IMMEDIATE ... COMMIT so concurrent writers queue instead of clobbering."""
+
+    def __init__(self):
+        self.conn = _connect()
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        if not exc_type:
+            _CACHE.invalidate()
+        return False
+
+
+def _migrate_json(conn: sqlite3.Connection) -> None:
+    """One-time import of the legacy json store into an empty database."""
+    with _migrate_lock:
+        if conn.execute("SELECT 1 FROM users LIMIT 1").fetchone():
+            return
+        legacy = next((p for p in LEGACY_PATHS if p.exists()), None)
+        if legacy is None:
+            return
+        with legacy.open("r", encoding="utf-8") as f:
+            users = json.load(f)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # migrated holdings have no dates, they become the opening balance
+            _write_users(conn, users, journal=False)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def _ensure_opening_snapshots(conn: sqlite3.Connection) -> None:
+    """Give every user without one an opening snapshot of their current positions."""
+    missing = conn.execute(
+        "SELECT username FROM users WHERE username NOT IN "
+        "(SELECT username FROM snapshots WHERE last_trade_id = 0)"
+    ).fetchall()
+    for (username,) in missing:
+        _insert_opening(conn, username)
+
+
+def _insert_opening(conn: sqlite3.Connection, username: str) -> None:
+    holdings = dict(
+        conn.execute(
+            "SELECT ticker, shares FROM positions WHERE username = ?", (username,)
+        ).fetchall()
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO snapshots (username, last_trade_id, as_of, holdings) "
+        "VALUES (?, 0, NULL, ?)",
+        (username, json.dumps(holdings)),
+    )
+
+
+def _write_users(conn: sqlite3.Connection, users: dict, journal: bool = True) -> None:
+    for username, record in users.items():
+        conn.execute(
+            "INSERT INTO users (username, password) VALUES (?, ?) "
+            "ON CONFLICT(username) DO UPDATE SET password = excluded.password",
+            (username, record["password"]),
+        )
+        new = record.get("portfolio", {})
+        if not journal:
+            conn.execute("DELETE FROM positions WHERE username = ?", (username,))
+            conn.executemany(
+                "INSERT INTO positions (username, ticker, shares) VALUES (?, ?, ?)",
+                [(username, t, s) for t, s in new.items()],
+            )
+            continue
+        # whole-portfolio writes are journaled as the trades that produce the difference
+        _insert_opening(conn, username)
+        old = dict(
+            conn.execute(
+                "SELECT ticker, shares FROM positions WHERE username = ?", (username,)
+            ).fetchall()
+        )
+        for ticker in dict.fromkeys([*old, *new]):
+            _set_shares(conn, username, ticker, new.get(ticker, 0), None)
+
+
+def _signed(action: str, shares):
+    return shares if action == "buy" else -shares
+
+
+def _apply_trade(
+    conn: sqlite3.Connection, username: str, ticker: str, action: str, shares, trade_date
+) -> None:
+    """Append one trade and update the positions projection, inside the caller's transaction."""
+    conn.execute(
+        "INSERT INTO trades (username, ticker, trade_date, action, shares) VALUES (?, ?, ?, ?, ?)",
+        (username, ticker, (trade_date or date.today()).isoformat(), action, shares),
+    )
+    if action == "buy":
+        conn.execute(
+            "INSERT INTO positions (username, ticker, shares) VALUES (?, ?, ?) "
+            "ON CONFLICT(username, ticker) DO UPDATE SET shares = shares + excluded.shares",
+            (username, ticker, shares),
+        )
+    else:
+        conn.execute(
+            "UPDATE positions SET shares = shares - ? WHERE username = ? AND ticker = ?",
+            (shares, username, ticker),
+        )
+        conn.execute(
+            "DELETE FROM positions WHERE username = ? AND ticker = ? AND shares <= 0",
+            (username, ticker),
+        )
+    _maybe_compact(conn, username)
+
+
+def _held(conn: sqlite3.Connection, username: str, ticker: str):
+    row = conn.execute(
+        "SELECT shares FROM positions WHERE username = ? AND ticker = ?", (username, ticker)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def _set_shares(conn: sqlite3.Connection, username: str, ticker: str, shares, trade_date) -> None:
+    held = _held(conn, username, ticker)
+    if shares <= 0 and held > 0:
+        _apply_trade(conn, username, ticker, "remove", held, trade_date)
+    elif shares > held:
+        _apply_trade(conn, username, ticker, "buy", shares - held, trade_date)
+    elif shares < held:
+        _apply_trade(conn, username, ticker, "sell", held - shares, trade_date)
+
+
+def _latest_snapshot(conn: sqlite3.Connection, username: str, before: str | None = None):
+    """(last_trade_id, as_of, holdings) of the newest snapshot whose trades all predate ``before``."""
+    row = conn.execute(
+        "SELECT last_trade_id, as_of, holdings FROM snapshots "
+        "WHERE username = ? AND (as_of IS NULL OR as_of < ?) "
+        "ORDER BY last_trade_id DESC LIMIT 1",
+        (username, before or "9999-12-31"),
+    ).fetchone()
+    if row is None:
+        return 0, None, {}
+    return row[0], row[1], json.loads(row[2])
+
+
+def _maybe_compact(conn: sqlite3.Connection, username: str) -> None:
+    last_id, as_of, holdings = _latest_snapshot(conn, username)
+    tail = conn.execute(
+        "SELECT id, trade_date, ticker, action, shares FROM trades "
+        "WHERE username = ? AND id > ? ORDER BY id",
+        (username, last_id),
+    ).fetchall()
+    if len(tail) < COMPACT_EVERY:
+        return
+    for _, trade_date, ticker, action, shares in tail:
+        holdings[ticker] = holdings.get(ticker, 0) + _signed(action, shares)
+        as_of = max(as_of or trade_date, trade_date)
+    holdings = {t: s for t, s in holdings.items() if abs(s) > 1e-9}
+    conn.execute(
+        "INSERT INTO snapshots (username, last_trade_id, as_of, holdings) VALUES (?, ?, ?, ?)",
+        (username, tail[-1][0], as_of, json.dumps(holdings)),
+    )
+
+
+class _UserCache:
+    """Process-wide view of the user store, dropped only when the db files change
+    on disk or when one of our own writes goes through."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked_at = 0.0
+        self._users = {}  # username -> record, filled lazily per user
+        self._all = None  # full snapshot for load_users()
+        # bumped on every drop so a read that raced a write doesn't repopulate stale data
+        self._generation = 0
+
+    @staticmethod
+    def _stat_signature() -> tuple:
+        sig = []
+        for path in (DB_PATH, DB_PATH.with_name(DB_PATH.name + "-wal")):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                sig.append(None)
+                continue
+            sig.append((st.st_mtime_ns, st.st_size))
+        return tuple(sig)
 
+    def _check(self) -> None:
+        # caller holds the lock
+        now = time.monotonic()
+        if self._signature is not None and now - self._checked_at < CHANGE_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        signature = self._stat_signature()
+        if signature != self._signature:
+            self._signature = signature
+            self._generation += 1
+            self._users.clear()
+            self._all = None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._signature = None
+            self._generation += 1
+            self._users.clear()
+            self._all = None
+
+    def user(self, username: str) -> dict | None:
+        with self._lock:
+            self._check()
+            if username in self._users:
+                cache_result("users", hits=1)
+                return self._users[username]
+            generation = self._generation
+        cache_result("users", misses=1)
+        record = _read_user(username)
+        with self._lock:
+            if record is not None and generation == self._generation:
+                self._users[username] = record
+        return record
+
+    def all(self) -> dict:
+        with self._lock:
+            self._check()
+            if self._all is not None:
+                cache_result("all_users", hits=1)
+                return self._all
+            generation = self._generation
+        cache_result("all_users", misses=1)
+        users = _read_all_users()
+        with self._lock:
+            if generation == self._generation:
+                self._all = users
+                self._users.update(users)
+        return users
+
+
+_CACHE = _UserCache()
+
+
+def _read_user(username: str) -> dict | None:
+    conn = _connect()
+    row = conn.execute(
+        "SELECT password FROM users WHERE username = ?", (username,)
+    ).fetchone()
+    if row is None:
+        return None
+    rows = conn.execute(
+        "SELECT ticker, shares FROM positions WHERE username = ? ORDER BY rowid",
+        (username,),
+    ).fetchall()
+    return {"password": row[0], "portfolio": {ticker: shares for ticker, shares in rows}}
+
+
+def _read_all_users() -> dict:
+    conn = _connect()
+    users = {
+        username: {"password": password, "portfolio": {}}
+        for username, password in conn.execute("SELECT username, password FROM users")
+    }
+    for username, ticker, shares in conn.execute(
+        "SELECT username, ticker, shares FROM positions ORDER BY rowid"
+    ):
+        users[username]["portfolio"][ticker] = shares
+    return users
+
+
+@timed("get_user")
+def get_user(username: str) -> dict | None:
+    """One user's record in the same shape load_users() returns, or None."""
+    record = _CACHE.user(username)
+    if record is None:
+        return None
+    return {"password": record["password"], "portfolio": dict(record["portfolio"])}
+
+
+@timed("get_portfolio")
+def get_portfolio(username: str) -> dict:
+    record = _CACHE.user(username)
+    return dict(record["portfolio"]) if record else {}
+
+
+def create_user(username: str, password_hash: str) -> bool:
+    """Insert a new user, False if the name is already taken."""
+    with _transaction() as conn:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)",
+            (username, password_hash),
+        )
+        if cur.rowcount != 1:
+            return False
+        _insert_opening(conn, username)
+        return True
+
+
+def set_password(username: str, password_hash: str) -> None:
+    with _transaction() as conn:
+        conn.execute(
+            "UPDATE users SET password = ? WHERE username = ?", (password_hash, username)
+        )
+
+
+def add_shares(username: str, ticker: str, shares, trade_date: date | None = None) -> None:
+    """Journal a buy and add it to the position in one transaction."""
+    with _transaction() as conn:
+        _apply_trade(conn, username, ticker, "buy", shares, trade_date)
+
+
+def sell_shares(username: str, ticker: str, shares, trade_date: date | None = None) -> bool:
+    """Journal a sale (capped at what is held), False if nothing was held."""
+    with _transaction() as conn:
+        held = _held(conn, username, ticker)
+        if held <= 0:
+            return False
+        action = "remove" if shares >= held else "sell"
+        _apply_trade(conn, username, ticker, action, min(shares, held), trade_date)
+        return True
+
+
+def remove_position(username: str, ticker: str, trade_date: date | None = None) -> bool:
+    with _transaction() as conn:
+        held = _held(conn, username, ticker)
+        if held <= 0:
+            return False
+        _apply_trade(conn, username, ticker, "remove", held, trade_date)
+        return True
+
+
+def import_trades(username: str, trades) -> dict:
+    """Journal a batch of (ticker, action, shares, trade_date) trades in one
+    transaction, in the order given. Sells are capped at what is held at that
+    point, like sell_shares(). Returns how many trades of each kind went in."""
+    applied = {"buy": 0, "sell": 0, "skipped": 0}
+    with _transaction() as conn:
+        for ticker, action, shares, trade_date in trades:
+            if action == "buy":
+                _apply_trade(conn, username, ticker, "buy", shares, trade_date)
+                applied["buy"] += 1
+                continue
+            held = _held(conn, username, ticker)
+            if held <= 0:
+                applied["skipped"] += 1
+                continue
+            action = "remove" if shares >= held else "sell"
+            _apply_trade(conn, username, ticker, action, min(shares, held), trade_date)
+            applied["sell"] += 1
+    return applied
+
+
+def held_tickers(usernames=None) -> list[str]:
+    """Distinct tickers held by ``usernames``, or by anyone when None, straight
+    from the positions table so the caller doesn't copy the whole store."""
+    conn = _connect()
+    if usernames is None:
+        return [t for (t,) in conn.execute("SELECT DISTINCT ticker FROM positions")]
+    names = list(usernames)
+    tickers = {}
+    # chunked to stay under sqlite's bound-parameter limit
+    for i in range(0, len(names), 500):
+        chunk = names[i : i + 500]
+        rows = conn.execute(
+            "SELECT DISTINCT ticker FROM positions WHERE username IN "
+            f"({','.join('?' * len(chunk))})",
+            chunk,
+        )
+        tickers.update(dict.fromkeys(t for (t,) in rows))
+    return list(tickers)
+
+
+def load_journal(username: str, since: date | None = None) -> tuple[dict, list]:
+    """Baseline holdings from the newest snapshot entirely before ``since`` plus the
+    trades journaled after it, as (trade_date, ticker, signed shares).
+
+    Replaying the trades onto the baseline gives the position history from
+    ``since`` on, in O(snapshot + tail).
+    """
+    conn = _connect()
+    last_id, _, baseline = _latest_snapshot(
+        conn, username, since.isoformat() if since else None
+    )
+    rows = conn.execute(
+        "SELECT trade_date, ticker, action, shares FROM trades "
+        "WHERE username = ? AND id > ? ORDER BY id",
+        (username, last_id),
+    ).fetchall()
+    trades = [(d, ticker, _signed(action, shares)) for d, ticker, action, shares in rows]
+    return baseline, trades
+
+
+def load_journals(since: date | None = None) -> dict:
+    """load_journal() for every user at once, username -> (baseline, trades).
+
+    Two scans of the store instead of two queries per user, for batch jobs.
+    Snapshots are read first: compaction only adds snapshots, never drops
+    trades, so a write landing in between can't lose anything.
+    """
+    conn = _connect()
+    baselines = {username: (0, {}) for (username,) in conn.execute("SELECT username FROM users")}
+    for username, last_id, holdings in conn.execute(
+        "SELECT s.username, s.last_trade_id, s.holdings FROM snapshots s JOIN ("
+        "  SELECT username, MAX(last_trade_id) AS last_id FROM snapshots"
+        "  WHERE as_of IS NULL OR as_of < ? GROUP BY username"
+        ") m ON s.username = m.username AND s.last_trade_id = m.last_id",
+        (since.isoformat() if since else "9999-12-31",),
+    ):
+        baselines[username] = (last_id, json.loads(holdings))
+
+    journals = {username: (baseline, []) for username, (_, baseline) in baselines.items()}
+    for username, trade_id, trade_date, ticker, action, shares in conn.execute(
+        "SELECT username, id, trade_date, ticker, action, shares FROM trades ORDER BY username, id"
+    ):
+        if username in baselines and trade_id > baselines[username][0]:
+            journals[username][1].append((trade_date, ticker, _signed(action, shares)))
+    return journals
+
+
+@timed("load_users")
 def load_users() -> dict:
-    if USERS_PATH.exists():
-        with USERS_PATH.open("r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+    # callers may mutate what they get back, so hand out a copy of the cached view
+    return {
+        username: {"password": record["password"], "portfolio": dict(record["portfolio"])}
+        for username, record in _CACHE.all().items()
+    }
+
 
 def save_users(users: dict) -> None:
-    with USERS_PATH.open("w", encoding="utf-8") as f:
-        json.dump(users, f, indent=2, ensure_ascii=False)
+    # kept for callers that still hand over the whole dict; prefer the per-user helpers
+    with _transaction() as conn:
+        _write_users(conn, users)
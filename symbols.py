@@ -0,0 +1,165 @@
+import csv
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+# bundled snapshot of listed symbols. Drop a newer export over it (or point the
+# env var somewhere else) and running servers pick it up without a restart
+SYMBOLS_FILE = Path(
+    os.environ.get(
+        "CPORTFOLIO_SYMBOLS_FILE",
+        Path(__file__).resolve().parent / "data" / "symbols.csv",
+    )
+)
+# how often (seconds) the file is stat'ed for a newer export
+RELOAD_CHECK_INTERVAL = 60
+SEARCH_LIMIT = 10
+# tried when an unknown symbol looks like a bare crypto or TSX ticker, e.g. BTC -> BTC-USD
+SUGGEST_SUFFIXES = ("-USD", ".TO", "-CAD")
+
+_END = "\uffff"
+# shape of a Yahoo ticker, for deciding whether an unlisted entry is worth a lookup
+_TICKER = re.compile(r"[A-Z0-9^][A-Z0-9.\-=^]{0,15}")
+
+
+def normalize(symbol: str) -> str:
+    return symbol.strip().upper()
+
+
+def looks_like_symbol(symbol: str) -> bool:
+    return _TICKER.fullmatch(normalize(symbol)) is not None
+
+
+class SymbolIndex:
+    """Immutable view of one symbol file: exact lookups plus prefix search over
+    sorted arrays of symbols and of the words in each company name."""
+
+    def __init__(self, rows):
+        self.info = {}
+        for row in rows:
+            symbol = normalize(row.get("symbol") or "")
+            if symbol:
+                self.info[symbol] = row
+        self.symbols = sorted(self.info)
+        self.words = sorted(
+            {
+                (word, symbol)
+                for symbol, row in self.info.items()
+                for word in (row.get("name") or "").lower().split()
+            }
+        )
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.info
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def _symbol_prefix(self, prefix: str) -> list[str]:
+        lo = bisect_left(self.symbols, prefix)
+        hi = bisect_left(self.symbols, prefix + _END, lo)
+        return self.symbols[lo:hi]
+
+    def _word_prefix(self, prefix: str) -> list[str]:
+        lo = bisect_left(self.words, (prefix,))
+        hi = bisect_left(self.words, (prefix + _END,), lo)
+        return [symbol for _, symbol in self.words[lo:hi]]
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT) -> list[str]:
+        """Symbols starting with ``query`` (exact match first), then symbols whose
+        company name has a word starting with it."""
+        query = query.strip()
+        if not query:
+            return []
+        matches = dict.fromkeys(self._symbol_prefix(normalize(query)))
+        if len(matches) < limit:
+            matches.update(dict.fromkeys(self._word_prefix(query.lower())))
+        return list(matches)[:limit]
+
+
+class SymbolMaster:
+    """Process-wide symbol index, reloaded when the symbol file changes on disk.
+
+    With no symbol file there's nothing to check against, so every symbol is
+    treated as known rather than locking users out of adding positions. The
+    file isn't exhaustive either: it drives search and validation of new
+    entries, while symbols already held are priced whether or not it lists them.
+    """
+
+    def __init__(self, path: Path = SYMBOLS_FILE):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._index = None
+        self._signature = None
+        self._checked_at = 0.0
+
+    def _stat_signature(self):
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (str(self.path), st.st_mtime_ns, st.st_size)
+
+    def _read(self) -> SymbolIndex:
+        try:
+            with self.path.open("r", encoding="utf-8", newline="") as f:
+                return SymbolIndex(csv.DictReader(f))
+        except FileNotFoundError:
+            return SymbolIndex([])
+
+    def index(self) -> SymbolIndex:
+        with self._lock:
+            now = time.monotonic()
+            if self._index is not None and now - self._checked_at < RELOAD_CHECK_INTERVAL:
+                return self._index
+            self._checked_at = now
+            signature = self._stat_signature()
+            if self._index is None or signature != self._signature:
+                self._index = self._read()
+                self._signature = signature
+            return self._index
+
+    def reload(self) -> None:
+        with self._lock:
+            self._index = None
+
+    def is_known(self, symbol: str) -> bool:
+        index = self.index()
+        return not len(index) or normalize(symbol) in index
+
+    def split(self, tickers) -> tuple[list[str], list[str]]:
+        """(known, unknown) tickers, order preserved."""
+        index = self.index()
+        if not len(index):
+            return list(tickers), []
+        known, unknown = [], []
+        for ticker in tickers:
+            (known if ticker in index else unknown).append(ticker)
+        return known, unknown
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT) -> list[str]:
+        return self.index().search(query, limit)
+
+    def suggest(self, symbol: str, limit: int = 3) -> list[str]:
+        """Likely meant-to-be symbols for an unknown one."""
+        index = self.index()
+        symbol = normalize(symbol)
+        candidates = [symbol + suffix for suffix in SUGGEST_SUFFIXES if symbol + suffix in index]
+        candidates += index.search(symbol, limit)
+        return [c for c in dict.fromkeys(candidates) if c != symbol][:limit]
+
+    def name(self, symbol: str) -> str | None:
+        row = self.index().info.get(normalize(symbol))
+        return row.get("name") if row else None
+
+    def label(self, symbol: str) -> str:
+        """``"AAPL · Apple Inc."`` for pickers, the bare symbol if it has no name."""
+        name = self.name(symbol)
+        return f"{symbol} · {name}" if name else symbol
+
+
+# one index shared by every session in the server process
+SYMBOLS = SymbolMaster()